@@ -0,0 +1,46 @@
+"""
+Helpers shared by the headless batch tools (stdconv.py, maprender.py).
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def unique_outputs(sources, find):
+    """
+    Collect what find(source) yields for each source, as (item, relative path)
+    pairs, into a list of (item, output path) with output paths that don't
+    clash. With several sources each output path is prefixed with the name
+    of its source directory (or of the directory holding a file source).
+    Items whose output path is still taken (compared case-insensitively, as
+    the output may live on a case-insensitive filesystem) are reported and
+    left out. Returns (outputs, collisions).
+    """
+    outputs = []
+    taken = {}
+    collisions = 0
+    for source in sources:
+        source = Path(source)
+        prefix = Path()
+        if len(sources) > 1:
+            prefix = Path(source.name if source.is_dir() else source.resolve().parent.name)
+        for item, rel_path in find(source):
+            out_path = prefix / rel_path
+            key = out_path.as_posix().lower()
+            if key in taken:
+                print(f"Error: {item} would be saved as {out_path}, like {taken[key]}; skipping it",
+                      file=sys.stderr)
+                collisions += 1
+                continue
+            taken[key] = item
+            outputs.append((item, out_path))
+    return outputs, collisions
+
+
+def run_jobs(fn, work, jobs=None):
+    """Run fn on every item of work on a process pool, yielding the results in order"""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # Hand out work in chunks so small files don't drown in IPC overhead
+        chunksize = max(1, len(work) // ((jobs or os.cpu_count() or 1) * 4))
+        yield from pool.map(fn, work, chunksize=chunksize)
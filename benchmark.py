@@ -0,0 +1,296 @@
+"""
+Benchmarks for the decode, render, thumbnail and parse hot paths.
+
+Builds synthetic corpora of N file sets (the sprites of sample1.std.bak plus
+generated .inf, .map and .dat files) for each requested size, times the
+viewers' hot paths on them and saves the results as JSON. Runs headless:
+pygame uses SDL's dummy video driver, and the Tk PhotoImage step is skipped
+(with only the PPM encoding timed) when no display is available.
+
+use: python benchmark.py [--sizes 10,100,1000] [--repeat 5] [-o results.json] [--compare old.json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import platform
+import tempfile
+import contextlib
+from pathlib import Path
+
+# Must be set before pygame is initialised
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+import py_gui_main
+import python_version
+from file_index import DirectoryIndex
+from std_decoder import (INF_RECORD, MAP_SIZE, SPRITE_BYTES, TOTALANIMS, anim_record_dtype,
+                         open_std, read_dat, read_inf, read_map)
+from thumbnail_cache import ThumbnailCache
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+SAMPLE_STD = PACKAGE_DIR / "sample1.std.bak"
+DEFAULT_SIZES = (10, 100, 1000)
+
+
+def make_std(sample, rng):
+    """Sprite data for one synthetic .std: the sample's sprites shuffled, 1 to 100 of them"""
+    sprites = np.frombuffer(sample, dtype=np.uint8)[:len(sample) // SPRITE_BYTES * SPRITE_BYTES]
+    sprites = sprites.reshape(-1, SPRITE_BYTES)
+    count = int(rng.integers(1, 101))
+    return sprites[rng.integers(0, len(sprites), count)].tobytes()
+
+
+def make_inf(rng):
+    """A .inf file with 10 rows of 1 to 10 shape records"""
+    out = io.BytesIO()
+    for row in range(10):
+        max_count = int(rng.integers(0, 10))
+        records = np.zeros(max_count + 1, dtype=INF_RECORD)
+        records["w"] = records["h"] = 16
+        records["n"] = np.arange(max_count + 1)
+        records["c"] = row
+        records["flag"] = rng.integers(0, 2, max_count + 1)
+        records["rowflag"] = rng.integers(0, 2)
+        out.write(b"%d\n" % max_count)
+        out.write(records.tobytes())
+    return out.getvalue()
+
+
+def make_map(rng):
+    """A .map file: 100x100 sprite indices (or -1 for empty), one per line"""
+    values = rng.integers(-1, 100, MAP_SIZE * MAP_SIZE)
+    return "".join(f"{value}\n" for value in values).encode()
+
+
+def make_dat(rng):
+    """A .dat file of TOTALANIMS animation objects with 32-bit ints"""
+    records = np.zeros(TOTALANIMS, dtype=anim_record_dtype(4))
+    records["active"] = rng.integers(0, 2, TOTALANIMS)
+    records["animwidth"] = records["animheight"] = 1
+    records["animx"] = rng.integers(0, 40, TOTALANIMS)
+    records["animy"] = rng.integers(0, 30, TOTALANIMS)
+    records["animspeed"] = rng.integers(1, 5, TOTALANIMS)
+    records["max"] = rng.integers(0, 10, TOTALANIMS)
+    records["row"] = rng.integers(0, 10, TOTALANIMS)
+    return records.tobytes()
+
+
+def build_corpus(directory, size, seed=0):
+    """Write `size` synthetic file sets set0000.std/.inf/.map/.dat into directory"""
+    rng = np.random.default_rng(seed)
+    sample = SAMPLE_STD.read_bytes()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(size):
+        base = directory / f"set{i:04d}"
+        base.with_suffix(".std").write_bytes(make_std(sample, rng))
+        base.with_suffix(".inf").write_bytes(make_inf(rng))
+        base.with_suffix(".map").write_bytes(make_map(rng))
+        base.with_suffix(".dat").write_bytes(make_dat(rng))
+    return directory
+
+
+def measure(fn, repeat, setup=None):
+    """Run fn `repeat` times (calling setup untimed before each run), returning timing stats in seconds"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": float(np.median(times)), "mean": float(np.mean(times)), "runs": repeat}
+
+
+def quietly(fn):
+    """Wrap fn so the viewers' progress prints don't flood the output"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+def first_frame_stats(directory, repeat):
+    """Time from a fresh interpreter importing py_gui_main to its first frame, in seconds"""
+    code = ("import sys, py_gui_main as m; v = m.DOSSpriteViewer(sys.argv[1], started=m.STARTED); "
+            "v.prefetch_count = 0; v.start(); print('first_frame_ms', v.first_frame_ms)")
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code, directory], cwd=PACKAGE_DIR, env=os.environ,
+                             capture_output=True, text=True, check=True).stdout
+        ms = [line.split()[1] for line in out.splitlines() if line.startswith("first_frame_ms ")][0]
+        times.append(float(ms) / 1000)
+    return {"min": min(times), "median": float(np.median(times)), "mean": float(np.mean(times)), "runs": repeat}
+
+
+def open_tk():
+    """A hidden Tk root for PhotoImage, or None when there is no display"""
+    try:
+        root = python_version.tk.Tk()
+    except python_version.tk.TclError:
+        return None
+    root.withdraw()
+    return root
+
+
+def bench_corpus(directory, repeat, tk_root=None):
+    """Time every benchmark on one corpus directory, returning {name: stats}"""
+    results = {}
+    index = DirectoryIndex(directory)
+    std_paths = index.paths("std")
+    bases = index.base_names("std")
+    inf_paths = [index.find(base)["inf"].path for base in bases]
+    map_paths = [index.find(base)["map"].path for base in bases]
+    dat_paths = [index.find(base)["dat"].path for base in bases]
+
+    # Directory listing and parsing
+    results["directory_index"] = measure(lambda: DirectoryIndex(directory), repeat)
+    file_set = py_gui_main.DOSFileSet(directory, bases[0])
+    results["load_std_file"] = measure(quietly(lambda: [file_set.load_std_file(p) for p in std_paths]), repeat)
+    results["read_inf"] = measure(lambda: [read_inf(p) for p in inf_paths], repeat)
+    results["read_map"] = measure(lambda: [read_map(p) for p in map_paths], repeat)
+    results["read_dat"] = measure(lambda: [read_dat(p) for p in dat_paths], repeat)
+    results["load_file_set"] = measure(
+        quietly(lambda: [py_gui_main.DOSFileSet(directory, base).load() for base in bases]), repeat)
+
+    # Thumbnails: the tkinter viewer's palette mapping, the sqlite cache and PhotoImage creation
+    sprites = [open_std(p).sprites for p in std_paths]
+    to_rgb = python_version.STDViewer.create_image_from_pixel_data
+    results["create_image_from_pixel_data"] = measure(lambda: [to_rgb(None, s) for s in sprites], repeat)
+    firsts = [to_rgb(None, s[0]) for s in sprites]
+    cache_dir = tempfile.mkdtemp(prefix="draw71-bench-")
+    try:
+        # Cold runs each start from a new, empty cache file
+        caches = []
+        def new_cache():
+            caches.append(ThumbnailCache(os.path.join(cache_dir, f"cold{len(caches)}.sqlite")))
+        results["thumbnail_cache_cold"] = measure(
+            lambda: [caches[-1].first_sprite(p) for p in std_paths], repeat, setup=new_cache)
+        for cache in caches:
+            cache.close()
+        warm = ThumbnailCache(os.path.join(cache_dir, "warm.sqlite"))
+        for p in std_paths:
+            warm.first_sprite(p)
+        results["thumbnail_cache_warm"] = measure(lambda: [warm.first_sprite(p) for p in std_paths], repeat)
+        warm.close()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    results["ppm_encode"] = measure(
+        lambda: [b"P6 16 16 255\n" + np.ascontiguousarray(rgb).tobytes() for rgb in firsts], repeat)
+    if tk_root is not None:
+        photo = python_version.STDViewer.rgb_to_photo
+        results["rgb_to_photo"] = measure(lambda: [photo(None, rgb, 4) for rgb in firsts], repeat)
+
+    # Startup of the pygame viewer, imports included
+    results["first_frame"] = first_frame_stats(directory, repeat)
+    budget = py_gui_main.DOSSpriteViewer.FIRST_FRAME_BUDGET_MS
+    if results["first_frame"]["median"] * 1000 > budget:
+        print(f"Warning: median time to first frame {results['first_frame']['median'] * 1000:.0f} ms "
+              f"is over the {budget} ms budget")
+
+    # pygame drawing of the first set, with empty caches (cold) and with everything rendered (warm)
+    with contextlib.redirect_stdout(io.StringIO()):
+        viewer = py_gui_main.DOSSpriteViewer(directory)
+        viewer.prefetch_count = 0  # Keep the loader thread idle while timing
+        viewer.scan_directory()
+        viewer.load_file_set(bases[0])
+        viewer.open_window()
+
+    def clear_caches():
+        viewer.surface_cache.clear()
+        viewer.layout_chunks.clear()
+
+    draws = {
+        "draw_sprite": lambda: [viewer.draw_sprite(row, i) for row in range(10) for i in range(10)],
+        "draw_sprite_grid": viewer.draw_sprite_grid,
+        "draw_layout": lambda: [viewer.draw_layout(x, y) for x, y in ((0, 0), (40, 40), (80, 85))],
+        "draw_animations": viewer.draw_animations,
+        "draw_frame": viewer.draw_frame,
+    }
+    for name, draw in draws.items():
+        results[name + "_cold"] = measure(draw, repeat, setup=clear_caches)
+        results[name + "_warm"] = measure(draw, repeat)
+    viewer.prefetcher.stop()
+    return results
+
+
+def compare(results, baseline):
+    """Print each benchmark's median time against the same one in a previous results file"""
+    for size, benches in results["corpora"].items():
+        old_benches = baseline.get("corpora", {}).get(size, {})
+        for name, stats in benches.items():
+            old = old_benches.get(name)
+            if old is None:
+                continue
+            ratio = stats["median"] / old["median"] if old["median"] else float("inf")
+            flag = "  SLOWER" if ratio > 1.1 else ""
+            print(f"{size:>6} {name:30} {old['median'] * 1000:10.3f} ms -> {stats['median'] * 1000:10.3f} ms"
+                  f"  x{ratio:.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sprite viewers' hot paths on synthetic corpora")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated corpus sizes in file sets (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the corpora (default: 0)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="results file (default: benchmark.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--keep", help="build the corpora in this directory and keep them")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "corpora": {},
+    }
+
+    tk_root = open_tk()
+    if tk_root is None:
+        print("No display for Tk, skipping rgb_to_photo")
+    root = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix="draw71-corpus-"))
+    try:
+        for size in sizes:
+            directory = root / f"corpus{size}"
+            if not directory.exists():
+                print(f"Building corpus of {size} file sets in {directory}")
+                build_corpus(directory, size, args.seed)
+            print(f"Benchmarking {size} file sets")
+            results["corpora"][str(size)] = bench_corpus(str(directory), args.repeat, tk_root)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+        if tk_root is not None:
+            tk_root.destroy()
+        pygame.quit()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,9 @@ from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import struct
 
+from file_index import directory_index
+from thumbnail_cache import ThumbnailCache
+
 class STDViewer(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -13,6 +16,7 @@ class STDViewer(tk.Tk):
         # Store loaded images
         self.images = []
         self.photo_images = []
+        self.thumbnail_cache = ThumbnailCache()
         
         # Create UI elements
         self.create_widgets()
@@ -75,11 +79,8 @@ class STDViewer(tk.Tk):
         self.images = []
         self.photo_images = []
         
-        # Find all .STD files
-        std_files = []
-        for file in os.listdir(directory):
-            if file.lower().endswith('.std'):
-                std_files.append(os.path.join(directory, file))
+        # Find all .STD files (any case) in one pass over the directory
+        std_files = directory_index(directory).paths("std")
         
         if not std_files:
             messagebox.showinfo("No Files", "No .STD files found in the selected directory")
@@ -126,6 +127,9 @@ class STDViewer(tk.Tk):
             except Exception as e:
                 print(f"Error processing {std_file}: {e}")
         
+        # Save newly read thumbnails for the next scan
+        self.thumbnail_cache.commit()
+        
         self.status_var.set(f"Loaded {len(self.photo_images)} images from {len(std_files)} .STD files")
     
     def extract_first_image(self, std_file):
@@ -134,31 +138,14 @@ class STDViewer(tk.Tk):
         Assuming each image is 16x16 pixels with 1 byte per pixel.
         """
         try:
-            with open(std_file, 'rb') as f:
-                # Read the binary data for a 16x16 image
-                # Assuming 1 byte per pixel
-                image_size = 16 * 16
-                pixel_data = f.read(image_size)
-                
-                if len(pixel_data) < image_size:
-                    return None  # Not enough data
-                
-                # Create a new RGB image
-                img = Image.new('RGB', (16, 16))
-                pixels = []
-                
-                # Convert each byte to an RGB value
-                # Assuming a simple color palette or grayscale
-                for byte in pixel_data:
-                    # Simple grayscale conversion
-                    # You might need to adjust this based on your actual format
-                    value = byte if isinstance(byte, int) else ord(byte)
-                    # Map to RGB - this is a simple grayscale mapping
-                    # Modify this according to your original color palette
-                    pixels.append((value, value, value))
-                
-                img.putdata(pixels)
-                return img
+            # First sprite comes from the persistent thumbnail cache when the file is unchanged
+            sprite = self.thumbnail_cache.first_sprite(std_file)
+            if sprite is None:
+                return None  # Not enough data
+            
+            # Simple grayscale mapping of the raw byte values
+            # Modify this according to your original color palette
+            return Image.fromarray(sprite, 'L').convert('RGB')
                 
         except Exception as e:
             print(f"Error reading {std_file}: {e}")
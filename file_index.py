@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import namedtuple
+
+# The files making up one set, by lowercase extension
+SET_EXTENSIONS = ("std", "inf", "map", "dat")
+
+# One file of a set, with the stat info from the directory sweep that found it
+IndexedFile = namedtuple("IndexedFile", "path size mtime")
+
+# On POSIX stat() costs a system call per file but the inode comes with the
+# listing; on Windows it is the other way round
+STAT_IS_FREE = os.name == "nt"
+
+
+class DirectoryIndex:
+    """
+    Index of the .std/.inf/.map/.dat file sets in one directory, built with a
+    single os.scandir pass. Names are grouped case-insensitively, so FOO.STD
+    and foo.inf belong to the same set. refresh() only sweeps the directory
+    again if its mtime changed (i.e. files were added, removed or renamed),
+    and then only stats the files that are new since the last sweep, so a
+    refresh costs one listing rather than a stat per file. Files changed in
+    place keep the size and mtime they were first indexed with. Safe to
+    share between threads.
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.sets = {}  # Lowercase base name -> {extension: IndexedFile}
+        self.names = {}  # Lowercase base name -> base name as spelled by its .std (or first) file
+        self.entries = {}  # File name -> (inode, IndexedFile), reused by the next sweep
+        self.dir_mtime = None
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the directory if it changed since the last sweep. Returns True if it did."""
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        if dir_mtime == self.dir_mtime:
+            return False
+
+        sets = {}
+        names = {}
+        known = {}
+        previous = self.entries
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                base, dot, ext = entry.name.rpartition(".")
+                ext = ext.lower()
+                if not dot or ext not in SET_EXTENSIONS:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    inode = None if STAT_IS_FREE else entry.inode()
+                    old = previous.get(entry.name)
+                    if old is not None and inode is not None and old[0] == inode:
+                        indexed = old[1]  # Same file as last sweep
+                    else:
+                        st = entry.stat()
+                        indexed = IndexedFile(entry.path, st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue  # Removed while we were listing
+                known[entry.name] = (inode, indexed)
+                key = base.lower()
+                files = sets.setdefault(key, {})
+                # On case-sensitive filesystems foo.std and foo.STD can both exist;
+                # prefer the lowercase extension, as the viewers always have
+                if ext in files and not entry.name.endswith("." + ext):
+                    continue
+                files[ext] = indexed
+                if ext == "std" or key not in names:
+                    names[key] = base
+
+        with self.lock:
+            self.sets = sets
+            self.names = names
+            self.entries = known
+            self.dir_mtime = dir_mtime
+        return True
+
+    def base_names(self, ext="std"):
+        """Base names of the sets that have a file with extension ext, sorted case-insensitively"""
+        with self.lock:
+            return sorted((self.names[key] for key, files in self.sets.items() if ext in files), key=str.lower)
+
+    def paths(self, ext="std"):
+        """Paths of all files with extension ext, in base_names() order"""
+        with self.lock:
+            files = [(key, files[ext].path) for key, files in self.sets.items() if ext in files]
+        return [path for key, path in sorted(files)]
+
+    def find(self, base_name):
+        """
+        The files of the set called base_name (any case), as {extension: IndexedFile},
+        empty if there is none. Misses re-check the directory in case the set is new.
+        """
+        key = base_name.lower()
+        with self.lock:
+            files = self.sets.get(key)
+        if files is None and self.refresh():
+            with self.lock:
+                files = self.sets.get(key)
+        return dict(files or {})
+
+    def __len__(self):
+        return len(self.sets)
+
+
+# Indexes shared by all the viewers, one per directory
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def directory_index(directory):
+    """Return the shared, refreshed DirectoryIndex for directory"""
+    path = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = DirectoryIndex(path)
+            return index
+    index.refresh()
+    return index
@@ -0,0 +1,135 @@
+"""
+Headless .map layout renderer.
+
+Renders the whole 100x100 layout of every set that has both a .map and a
+.std file into one <name>.png image, tiles gathered with numpy in one go
+rather than drawn cell by cell, so no display is needed. Empty cells and
+transparent pixels show the layout background like in the viewer. The
+directory layout of the sources is mirrored under the output directory and
+sets are rendered in parallel on a process pool.
+
+use: python maprender.py [-o OUTDIR] [--scale N] [--grid] [--format png|bmp] [--jobs N] SOURCE [SOURCE ...]
+"""
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from batch import run_jobs, unique_outputs
+from file_index import directory_index
+from std_decoder import (LAYOUT_BACKGROUND, LAYOUT_GRID_COLOR, SPRITE_SIZE, VGA256_PALETTE, layout_pixels,
+                         read_map, read_std)
+
+FORMATS = ("png", "bmp")
+SHEET_SPRITES = 100  # Map values address 10 rows of 10 shapes
+
+
+def find_map_sets(sources):
+    """Yield (std_path, map_path, relative_dir) for each set with a .map and a .std in the given files/directories"""
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                index = directory_index(root)
+                for base in index.base_names("map"):
+                    set_files = index.find(base)
+                    if "std" in set_files:
+                        yield set_files["std"].path, set_files["map"].path, Path(root).relative_to(source)
+        else:
+            # A .map (or .std) file: render the set it belongs to
+            files = directory_index(source.parent).find(source.stem)
+            if "std" in files and "map" in files:
+                yield files["std"].path, files["map"].path, Path()
+            else:
+                print(f"No .std and .map pair for {source}", file=sys.stderr)
+
+
+def render_map(std_path, map_path, scale=1, grid=False):
+    """Render a whole layout as a PIL image, `scale` screen pixels per sprite pixel"""
+    # The first 100 sprites make up the shape sheet; missing ones are blank
+    sheet = np.zeros((SHEET_SPRITES, SPRITE_SIZE, SPRITE_SIZE), dtype=np.uint8)
+    sprites = read_std(std_path, SHEET_SPRITES)
+    sheet[:len(sprites)] = sprites
+    pixels = layout_pixels(read_map(map_path), sheet)
+
+    # Index 0 is transparent, so it shows the background rather than black
+    palette = VGA256_PALETTE.copy()
+    palette[0] = LAYOUT_BACKGROUND
+    img = Image.fromarray(pixels, "P")
+    img.putpalette(palette.tobytes())
+    if scale != 1:
+        img = img.resize((img.width * scale, img.height * scale), Image.NEAREST)
+
+    if grid:
+        # Grid lines along the top and left edge of every cell, like the viewer
+        rgb = np.array(img.convert("RGB"))
+        tile_size = SPRITE_SIZE * scale
+        rgb[::tile_size, :] = LAYOUT_GRID_COLOR
+        rgb[:, ::tile_size] = LAYOUT_GRID_COLOR
+        img = Image.fromarray(rgb, "RGB")
+    return img
+
+
+def _render_job(job):
+    std_path, map_path, out_dir, scale, grid, fmt = job
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        target = out_dir / f"{Path(map_path).stem}.{fmt}"
+        render_map(std_path, map_path, scale, grid).save(target)
+        return map_path, None
+    except Exception as e:
+        return map_path, e
+
+
+def render_all(sources, out_dir, scale=1, grid=False, fmt="png", jobs=None):
+    """
+    Render every set with a .map under sources on a process pool. With several
+    sources the output paths are prefixed as described in batch.unique_outputs,
+    and maps that would overwrite another one's image are skipped as errors.
+    Returns (rendered, errors).
+    """
+    std_paths = {}
+
+    def find(source):
+        for std_path, map_path, rel_dir in find_map_sets([source]):
+            std_paths[map_path] = std_path
+            yield map_path, rel_dir / Path(map_path).stem
+
+    outputs, errors = unique_outputs(sources, find)
+    work = [(std_paths[map_path], map_path, Path(out_dir) / out_path.parent, scale, grid, fmt)
+            for map_path, out_path in outputs]
+    rendered = 0
+
+    for map_path, error in run_jobs(_render_job, work, jobs):
+        if error is not None:
+            print(f"Error rendering {map_path}: {error}", file=sys.stderr)
+            errors += 1
+        else:
+            rendered += 1
+    return rendered, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render .map layouts to images without a display")
+    parser.add_argument("sources", nargs="+", help=".map files or directories to search recursively")
+    parser.add_argument("-o", "--output", default=".", help="output directory (default: current directory)")
+    parser.add_argument("-s", "--scale", type=int, default=1,
+                        help="image pixels per sprite pixel (default: 1, i.e. 1600x1600 images)")
+    parser.add_argument("-g", "--grid", action="store_true", help="draw the cell grid like the viewer")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="png", help="image format (default: png)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+
+    rendered, errors = render_all(args.sources, args.output, args.scale, args.grid, args.format, args.jobs)
+    print(f"rendered {rendered} layouts to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
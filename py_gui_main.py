@@ -1,207 +1,151 @@
-import os
-import sys
-import struct
+import time
+
+# Start of the time to first frame, before the heavier imports
+STARTED = time.perf_counter()
+
+import argparse
+import threading
 import numpy as np
 import pygame
 from pygame.locals import *
 from pathlib import Path
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from file_index import directory_index
+from std_decoder import (INF_SHAPE, LAYOUT_BACKGROUND, LAYOUT_GRID_COLOR, TOTALANIMS, VGA256_PALETTE, STDFile,
+                         empty_anims, empty_map, layout_pixels, read_dat, read_inf, read_map)
+
+def anim_field(name):
+    """Property reading and writing one animation object's entry in a column"""
+    return property(lambda self: int(self.columns[name][self.index]),
+                    lambda self, value: self.columns[name].__setitem__(self.index, value))
 
 class DOSAnimObject:
     """Class representing animation object structure from the original code"""
-    def __init__(self):
-        self.active = 0
-        self.animwidth = 0
-        self.animheight = 0
-        self.animox = 0
-        self.animoy = 0
-        self.animx = 0
-        self.animy = 0
-        self.prox = 0
-        self.animspeed = 0
-        self.currentshape = 0
-        self.oldshape = 0
-        self.max = 0
-        self.row = 0
+    __slots__ = ("columns", "index")
+    
+    def __init__(self, columns=None, index=0):
+        # Fields are views of entry `index` in shared columns (see std_decoder.read_dat)
+        self.columns = empty_anims(1) if columns is None else columns
+        self.index = index
+    
+    active = anim_field("active")
+    animwidth = anim_field("animwidth")
+    animheight = anim_field("animheight")
+    animox = anim_field("animox")
+    animoy = anim_field("animoy")
+    animx = anim_field("animx")
+    animy = anim_field("animy")
+    prox = anim_field("prox")
+    animspeed = anim_field("animspeed")
+    currentshape = anim_field("currentshape")
+    oldshape = anim_field("oldshape")
+    max = anim_field("max")
+    row = anim_field("row")
         
+def info_field(name):
+    """Property reading and writing one field of a shape's INF record"""
+    return property(lambda self: int(self.info[name]),
+                    lambda self, value: self.info.__setitem__(name, value))
+
 class DOSShape:
     """Class representing a shape from the original code"""
-    def __init__(self):
-        self.w = 0
-        self.h = 0
-        self.n = 0
-        self.c = 0
-        self.flag = 0
-        self.rowflag = 0
-        self.shp = np.zeros((16, 16), dtype=np.uint8)
+    __slots__ = ("info", "shp")
+    
+    def __init__(self, info=None, shp=None):
+        # Metadata and pixels are views of one shape in the viewer's shared arrays, if given
+        self.info = np.zeros((), dtype=INF_SHAPE) if info is None else info
+        self.shp = np.zeros((16, 16), dtype=np.uint8) if shp is None else shp
+    
+    w = info_field("w")
+    h = info_field("h")
+    n = info_field("n")
+    c = info_field("c")
+    flag = info_field("flag")
+    rowflag = info_field("rowflag")
 
-class DOSSpriteViewer:
-    def __init__(self, directory="."):
-        """Initialize the sprite viewer with the directory to scan."""
+# Posted by the loader thread when a file set has been decoded
+FILESET_LOADED = pygame.USEREVENT + 1
+
+class DOSFileSet:
+    """The decoded contents of one .std/.inf/.map/.dat file set"""
+    def __init__(self, directory, base_filename, dat_int_size=None, dat_align=None):
         self.directory = directory
-        self.std_files = []
-        self.sprites = {}
-        self.current_file_base = None
-        self.current_sprite_index = 0
-        self.current_row = 0
-        self.zoom = 8  # Scale factor for pixels
-        self.grid_rows = 5
-        self.grid_cols = 10
-        self.view_mode = "sprite"  # "sprite", "grid", "layout"
-        
-        # Animation objects and layout data from the original program
-        self.anim_objects = [DOSAnimObject() for _ in range(10)]  # TOTALANIMS = 10
-        self.sprites_data = [[DOSShape() for _ in range(10)] for _ in range(10)]  # TOTALSHAPE = 10, TOTALANIMS = 10
-        self.layout = [[-1 for _ in range(100)] for _ in range(100)]  # Layout grid from original code
-        
-        # Initialize pygame
-        pygame.init()
-        self.screen = pygame.display.set_mode((1024, 768))
-        pygame.display.set_caption("DOS Sprite Viewer")
-        self.font = pygame.font.SysFont('Arial', 16)
-        self.clock = pygame.time.Clock()
-        
-        # Default color palette - EGA/VGA 16 colors
-        self.palette = [
-            (0, 0, 0),         # 0: Black
-            (0, 0, 170),       # 1: Blue
-            (0, 170, 0),       # 2: Green
-            (0, 170, 170),     # 3: Cyan
-            (170, 0, 0),       # 4: Red
-            (170, 0, 170),     # 5: Magenta
-            (170, 85, 0),      # 6: Brown
-            (170, 170, 170),   # 7: Light Gray
-            (85, 85, 85),      # 8: Dark Gray
-            (85, 85, 255),     # 9: Light Blue
-            (85, 255, 85),     # 10: Light Green
-            (85, 255, 255),    # 11: Light Cyan
-            (255, 85, 85),     # 12: Light Red
-            (255, 85, 255),    # 13: Light Magenta
-            (255, 255, 85),    # 14: Yellow
-            (255, 255, 255)    # 15: White
-        ]
-        
-        # Extend palette to 256 colors (for VGA)
-        for i in range(16, 256):
-            # Create a gradient of colors for the extended palette
-            r = (i % 6) * 51
-            g = ((i // 6) % 6) * 51
-            b = ((i // 36) % 6) * 51
-            self.palette.append((r, g, b))
+        self.base = base_filename
+        self.dat_int_size = dat_int_size
+        self.dat_align = dat_align
+        self.sprites = np.zeros((0, 16, 16), dtype=np.uint8)
+        self.inf = None  # (row_max, shapes) from read_inf
+        self.layout = None
+        self.anims = None
+        self.success = False
+        self.stamps = {}  # Extension -> (path, size, mtime) of the files it was loaded from
         
-    def scan_directory(self):
-        """Scan the directory for .std files (case-insensitive)"""
-        path = Path(self.directory)
-        # Look for both lowercase and uppercase extensions
-        lowercase_files = list(path.glob("*.std"))
-        uppercase_files = list(path.glob("*.STD"))
+    def file_stamps(self):
+        """(path, size, mtime) of each of the set's files as they are on disk now"""
+        stamps = {}
+        for ext, indexed in directory_index(self.directory).find(self.base).items():
+            try:
+                st = Path(indexed.path).stat()
+            except OSError:
+                continue  # Removed since the directory was indexed
+            stamps[ext] = (indexed.path, st.st_size, st.st_mtime_ns)
+        return stamps
         
-        # Combine the results
-        self.std_files = lowercase_files + uppercase_files
-        print(f"Found {len(self.std_files)} .std files")
+    def is_current(self):
+        """True if no file of the set was added, removed or changed since it was loaded"""
+        return self.file_stamps() == self.stamps
         
-        # Extract base filenames without extensions
-        self.base_filenames = [file.stem for file in self.std_files]
+    def nbytes(self):
+        """Approximate memory held by the decoded data"""
+        total = self.sprites.nbytes
+        if self.inf is not None:
+            total += self.inf[0].nbytes + self.inf[1].nbytes
+        if self.layout is not None:
+            total += self.layout.nbytes
+        if self.anims is not None:
+            total += sum(column.nbytes for column in self.anims.values())
+        return total
         
-        return len(self.std_files) > 0
-    
-    def load_file_set(self, base_filename):
-        """Load a complete set of files (.std, .inf, .map, .dat) for a given base filename"""
-        self.current_file_base = base_filename
+    def load(self):
+        """Load a complete set of files (.std, .inf, .map, .dat), returning self"""
+        base_filename = self.base
         success = True
         
-        # Reset data structures
-        self.anim_objects = [DOSAnimObject() for _ in range(10)]
-        self.sprites_data = [[DOSShape() for _ in range(10)] for _ in range(10)]
-        self.layout = [[-1 for _ in range(100)] for _ in range(100)]
-        self.sprites = {}
-        
-        # Try different case variations for .std file extension
-        std_path_lower = Path(self.directory) / f"{base_filename}.std"
-        std_path_upper = Path(self.directory) / f"{base_filename}.STD"
-        
-        if std_path_lower.exists():
-            print(f"Loading STD file: {std_path_lower}")
-            success &= self.load_std_file(std_path_lower)
-        elif std_path_upper.exists():
-            print(f"Loading STD file: {std_path_upper}")
-            success &= self.load_std_file(std_path_upper)
-        else:
-            print(f"STD file not found: {base_filename}.std or {base_filename}.STD")
-            success = False
-        
-        # Load .inf file (shape metadata) - try both cases
-        inf_path_lower = Path(self.directory) / f"{base_filename}.inf"
-        inf_path_upper = Path(self.directory) / f"{base_filename}.INF"
-        
-        if inf_path_lower.exists():
-            print(f"Loading INF file: {inf_path_lower}")
-            success &= self.load_inf_file(inf_path_lower)
-        elif inf_path_upper.exists():
-            print(f"Loading INF file: {inf_path_upper}")
-            success &= self.load_inf_file(inf_path_upper)
-        else:
-            print(f"INF file not found: {base_filename}.inf or {base_filename}.INF")
-            # Not required for basic viewing, so don't set success to False
-        
-        # Load .map file (layout data) - try both cases
-        map_path_lower = Path(self.directory) / f"{base_filename}.map"
-        map_path_upper = Path(self.directory) / f"{base_filename}.MAP"
-        
-        if map_path_lower.exists():
-            print(f"Loading MAP file: {map_path_lower}")
-            success &= self.load_map_file(map_path_lower)
-        elif map_path_upper.exists():
-            print(f"Loading MAP file: {map_path_upper}")
-            success &= self.load_map_file(map_path_upper)
-        else:
-            print(f"MAP file not found: {base_filename}.map or {base_filename}.MAP")
-            # Not required for basic viewing, so don't set success to False
-        
-        # Load .dat file (animation object data) - try both cases
-        dat_path_lower = Path(self.directory) / f"{base_filename}.dat"
-        dat_path_upper = Path(self.directory) / f"{base_filename}.DAT" 
-        
-        if dat_path_lower.exists():
-            print(f"Loading DAT file: {dat_path_lower}")
-            success &= self.load_dat_file(dat_path_lower)
-        elif dat_path_upper.exists():
-            print(f"Loading DAT file: {dat_path_upper}")
-            success &= self.load_dat_file(dat_path_upper)
-        else:
-            print(f"DAT file not found: {base_filename}.dat or {base_filename}.DAT")
-            # Not required for basic viewing, so don't set success to False
+        # Component files of the set, found case-insensitively in one directory sweep.
+        # Stamped before reading, so a change made while loading shows up as stale.
+        files = directory_index(self.directory).find(base_filename)
+        self.stamps = self.file_stamps()
+        loaders = (
+            ("std", self.load_std_file),
+            ("inf", self.load_inf_file),  # shape metadata
+            ("map", self.load_map_file),  # layout data
+            ("dat", self.load_dat_file),  # animation object data
+        )
+        for ext, load_file in loaders:
+            if ext in files:
+                print(f"Loading {ext.upper()} file: {files[ext].path}")
+                success &= load_file(files[ext].path)
+            else:
+                print(f"{ext.upper()} file not found: {base_filename}.{ext}")
+                # Only the .std file is required for basic viewing
+                if ext == "std":
+                    success = False
         
-        self.current_sprite_index = 0
-        self.current_row = 0
-        return success
+        self.success = success
+        return self
         
     def load_std_file(self, file_path):
         """Load a .std file containing raw sprite data"""
         try:
-            with open(file_path, "rb") as f:
-                data = f.read()
-                
-            # Each sprite is 256 bytes (16x16 pixels)
-            sprite_count = len(data) // 256
-            self.sprites = {}
-            
-            for i in range(sprite_count):
-                sprite_data = data[i*256:(i+1)*256]
-                # Convert to 16x16 array
-                sprite = np.zeros((16, 16), dtype=np.uint8)
-                for y in range(16):
-                    for x in range(16):
-                        sprite[y, x] = sprite_data[y*16 + x]
-                
-                self.sprites[i] = sprite
-                
-                # Also update the sprites_data structure
-                row = i // 10
-                col = i % 10
-                if row < 10 and col < 10:  # Ensure we don't exceed array bounds
-                    self.sprites_data[row][col].shp = sprite
+            # Each sprite is 256 bytes (16x16 pixels). Copied out of the mapping
+            # so the pixels are actually read here, not on first draw, and the
+            # file needn't stay open.
+            with STDFile(file_path) as reader:
+                self.sprites = np.array(reader.sprites)
             
-            print(f"Loaded {sprite_count} sprites from {file_path}")
+            print(f"Loaded {len(self.sprites)} sprites from {file_path}")
             return True
         except Exception as e:
             print(f"Error loading STD file: {e}")
@@ -210,43 +154,8 @@ class DOSSpriteViewer:
     def load_inf_file(self, file_path):
         """Load a .inf file containing sprite metadata"""
         try:
-            with open(file_path, "rb") as f:
-                # The inf file format has max counts for each row, followed by sprite data
-                for row in range(10):
-                    # Read the max count for this row
-                    max_count_str = f.readline().strip()
-                    if not max_count_str:
-                        break
-                    
-                    max_count = int(max_count_str)
-                    self.anim_objects[row].max = max_count
-                    
-                    # Read data for each sprite in this row (up to max_count)
-                    for s in range(max_count + 1):  # Including the last one
-                        # Based on the C code, we need to read:
-                        # int w, h, n, c, flag, rowflag
-                        # char shp[260]
-                        # But shape data is already loaded from .std, so we skip the shape bytes
-                        shape_header = f.read(16)  # Read the first 16 bytes (header)
-                        
-                        if len(shape_header) < 16:
-                            print(f"Warning: Incomplete data for shape {s} in row {row}")
-                            break
-                        
-                        # Parse the header
-                        # Format could be different, we're assuming ints are 4 bytes each
-                        if s < 10:  # Ensure we don't exceed array bounds
-                            shape = self.sprites_data[row][s]
-                            shape.w, shape.h, shape.n, shape.c = struct.unpack("<iiii", shape_header[:16])
-                            
-                            # Read flag and rowflag
-                            flag_data = f.read(8)
-                            if len(flag_data) == 8:
-                                shape.flag, shape.rowflag = struct.unpack("<ii", flag_data)
-                            
-                            # Skip shape data - We already have it from .std
-                            f.seek(256, os.SEEK_CUR)
-                
+            self.inf = read_inf(file_path)
+            
             print(f"Loaded shape metadata from {file_path}")
             return True
         except Exception as e:
@@ -256,13 +165,7 @@ class DOSSpriteViewer:
     def load_map_file(self, file_path):
         """Load a .map file containing layout data"""
         try:
-            with open(file_path, "rb") as f:
-                for i in range(100):
-                    for j in range(100):
-                        line = f.readline().strip()
-                        if not line:
-                            break
-                        self.layout[j][i] = int(line)
+            self.layout = read_map(file_path)
             
             print(f"Loaded layout data from {file_path}")
             return True
@@ -273,68 +176,419 @@ class DOSSpriteViewer:
     def load_dat_file(self, file_path):
         """Load a .dat file containing animation object data"""
         try:
-            with open(file_path, "rb") as f:
-                # Try to read the animobjects structure
-                # This is complex and we're making assumptions about structure size and alignment
-                data = f.read()
-                
-                # For now, we'll just read the data but not do much with it
-                # since we already have the necessary data from other files
-                
+            # The animobjects records, as one column per field
+            self.anims = read_dat(file_path, self.dat_int_size, self.dat_align)
+            
             print(f"Loaded animation data from {file_path}")
             return True
         except Exception as e:
             print(f"Error loading DAT file: {e}")
             return False
+
+class FileSetPrefetcher:
+    """
+    Loader thread that decodes file sets ahead of time into a byte-bounded
+    LRU cache. `notify(base)` is called from the thread after each load.
+    Requested sets that are already cached are re-checked against the disk
+    on the thread and reloaded if their files changed, so get() never does
+    any I/O; a set changed since it was last requested is still served.
+    """
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, notify=None, dat_int_size=None, dat_align=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.notify = notify
+        self.dat_int_size = dat_int_size
+        self.dat_align = dat_align
+        self.file_sets = OrderedDict()
+        self.total_bytes = 0
+        self.wanted = []  # Bases still to load, most urgent first
+        self.stopped = False
+        self.lock = threading.Condition()
+        self.thread = threading.Thread(target=self.worker, name="file-set-prefetch", daemon=True)
+        self.thread.start()
+        
+    def get(self, base):
+        """Return the cached file set for base (marking it recently used), or None"""
+        with self.lock:
+            file_set = self.file_sets.get(base)
+            if file_set is not None:
+                self.file_sets.move_to_end(base)
+            return file_set
+        
+    def put(self, file_set):
+        """Add a loaded file set, evicting the least recently used ones over the limit"""
+        with self.lock:
+            old = self.file_sets.pop(file_set.base, None)
+            if old is not None:
+                self.total_bytes -= old.nbytes()
+            self.file_sets[file_set.base] = file_set
+            self.total_bytes += file_set.nbytes()
+            while self.total_bytes > self.max_bytes and len(self.file_sets) > 1:
+                _, evicted = self.file_sets.popitem(last=False)
+                self.total_bytes -= evicted.nbytes()
+        
+    def request(self, bases):
+        """Replace the queue of file sets to load with `bases`; cached ones are only re-checked"""
+        with self.lock:
+            self.wanted = list(bases)
+            self.lock.notify()
+        
+    def worker(self):
+        while True:
+            with self.lock:
+                while not self.wanted and not self.stopped:
+                    self.lock.wait()
+                if self.stopped:
+                    return
+                base = self.wanted.pop(0)
+            
+            with self.lock:
+                cached = self.file_sets.get(base)
+            # Reuse the cached set unless its files changed since it was loaded
+            if cached is not None and cached.is_current():
+                continue
+            file_set = DOSFileSet(self.directory, base, self.dat_int_size, self.dat_align).load()
+            self.put(file_set)
+            if self.notify is not None:
+                self.notify(base)
+        
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify()
+
+class SurfaceCache:
+    """Byte-bounded LRU cache of rendered surfaces"""
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.surfaces = OrderedDict()
+        
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+        
+    def get(self, key):
+        """Return the cached surface for key (marking it recently used), or None"""
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+        return surface
+        
+    def put(self, key, surface):
+        """Store a surface, evicting the least recently used ones over the limit"""
+        if key in self.surfaces:
+            self.total_bytes -= self.surface_bytes(self.surfaces.pop(key))
+        self.surfaces[key] = surface
+        self.total_bytes += self.surface_bytes(surface)
+        while self.total_bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.total_bytes -= self.surface_bytes(evicted)
+        
+    def clear(self):
+        self.surfaces.clear()
+        self.total_bytes = 0
+        
+    def __len__(self):
+        return len(self.surfaces)
+
+class FrameProfiler:
+    """Wall-clock timings of the main loop's stages for each of the last `window` frames"""
+    HISTOGRAM_BINS = 16
+    HISTOGRAM_BIN_MS = 2  # Width of a histogram bin; the last one also counts slower frames
+    
+    def __init__(self, window=240):
+        self.window = window
+        self.frames = deque(maxlen=window)  # Total ms of each frame
+        self.stages = OrderedDict()  # Stage name -> deque of ms, for the frames it ran in
+        self.current = {}  # Stage times of the frame in progress
+        
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as part of stage `name` of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] = self.current.get(name, 0.0) + (time.perf_counter() - start) * 1000
+        
+    def end_frame(self):
+        """Record the frame in progress"""
+        if not self.current:
+            return
+        for name, ms in self.current.items():
+            if name not in self.stages:
+                self.stages[name] = deque(maxlen=self.window)
+            self.stages[name].append(ms)
+        self.frames.append(sum(self.current.values()))
+        self.current = {}
+        
+    def stage_stats(self):
+        """(name, last ms, mean ms) of each stage"""
+        return [(name, times[-1], sum(times) / len(times)) for name, times in self.stages.items()]
+        
+    def histogram(self):
+        """Frame counts per HISTOGRAM_BIN_MS wide bin of frame time"""
+        counts = [0] * self.HISTOGRAM_BINS
+        for ms in self.frames:
+            counts[min(int(ms // self.HISTOGRAM_BIN_MS), self.HISTOGRAM_BINS - 1)] += 1
+        return counts
+
+class DOSSpriteViewer:
+    LAYOUT_CHUNK = 8  # Layout cells per side of a pre-rendered layout chunk
+    LAYOUT_BACKGROUND = LAYOUT_BACKGROUND
+    LAYOUT_GRID_COLOR = LAYOUT_GRID_COLOR
+    ANIM_TICK_MS = 55  # One animspeed unit, the 18.2 Hz DOS timer tick
+    WINDOW_SIZE = (1024, 768)
+    FONT_FILE = None  # .ttf file for the UI text, None for pygame's built-in font
+    FONT_SIZE = 16
+    FIRST_FRAME_BUDGET_MS = 500  # Startup slower than this is reported
+    
+    def __init__(self, directory=".", started=None):
+        """
+        Initialize the sprite viewer with the directory to scan. Time to first
+        frame is measured from `started` (a time.perf_counter() value), or from now.
+        """
+        self.directory = directory
+        self.started = time.perf_counter() if started is None else started
+        self.std_files = []
+        self.sprites = np.zeros((0, 16, 16), dtype=np.uint8)  # All sprites of the current set
+        self.current_file_base = None
+        self.current_sprite_index = 0
+        self.current_row = 0
+        self.zoom = 8  # Scale factor for pixels
+        self.grid_rows = 5
+        self.grid_cols = 10
+        self.view_mode = "sprite"  # "sprite", "grid", "layout", "anim"
+        self.layout_x_offset = 0
+        self.layout_y_offset = 0
+        self.running = False
+        self.background = (30, 30, 30)
+        
+        # Screen areas drawn in the last frame, to be cleared in the next one
+        self.drawn_rects = []
+        
+        # Animation playback: frames follow the monotonic clock from anim_start.
+        # anim_cells holds [screen rect, frame strip, frame count, ms per frame, frame shown].
+        self.anim_start = time.monotonic()
+        self.anim_cells = []
+        
+        # Animation objects, shapes and layout data from the original program.
+        # These arrays are allocated once and refilled in place for each file set.
+        self.anim_columns = empty_anims()  # Animation object fields, one column each
+        self.dat_int_size = None  # Int size of .dat records, None to guess from the file size
+        self.dat_align = None  # Record alignment of .dat files, None for packed
+        self.shape_pixels = np.zeros((10, 10, 16, 16), dtype=np.uint8)  # [row, shape] pixels, TOTALSHAPE = 10
+        self.shape_info = np.zeros((10, 10), dtype=INF_SHAPE)  # [row, shape] INF metadata
+        self.layout = empty_map()  # Layout grid from original code, int16 indexed [x, y]
+        
+        # Object views of the arrays above, for code written against the original structs
+        self.anim_objects = [DOSAnimObject(self.anim_columns, i) for i in range(TOTALANIMS)]
+        self.sprites_data = [[DOSShape(self.shape_info[row, s, ...], self.shape_pixels[row, s])
+                              for s in range(10)] for row in range(10)]
+        
+        # Only the modules the viewer uses; pygame.init() would also start audio etc.
+        # The window is opened by open_window() once there is something to show,
+        # and the font is loaded on first use.
+        pygame.display.init()
+        pygame.font.init()
+        self.screen = None
+        self._font = None
+        self.first_frame_ms = None
+        
+        # Default color palette - EGA/VGA 16 colors extended to 256 (for VGA),
+        # kept as a 256x3 array so index arrays can be mapped to RGB in one lookup
+        self.palette = VGA256_PALETTE.copy()
+        self.palette_version = 0  # Bump whenever self.palette is modified
+        
+        # Rendered sprite surfaces, reused across frames and view modes
+        self.surface_cache = SurfaceCache()
+        
+        # The whole layout pre-rendered at the current zoom, in chunks of
+        # LAYOUT_CHUNK x LAYOUT_CHUNK cells (rendered the first time they're seen)
+        self.layout_chunks = SurfaceCache(max_bytes=128 * 1024 * 1024)
+        self.layout_chunks_key = None
+        
+        # File sets around the current one are decoded ahead of time on a loader
+        # thread, which posts a FILESET_LOADED event for each one it finishes
+        self.prefetcher = FileSetPrefetcher(directory, notify=self.post_file_set_loaded)
+        self.prefetch_count = 2  # File sets to prefetch on each side of the current one
+        self.loading_file_base = None  # File set being waited for, shown as loading
+        
+        # Stage timings of each frame, shown in an overlay toggled with F3
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        
+    @property
+    def font(self):
+        """UI font, loaded on first use"""
+        if self._font is None:
+            self._font = pygame.font.Font(self.FONT_FILE, self.FONT_SIZE)
+        return self._font
+        
+    def open_window(self):
+        """Create the window (once)"""
+        if self.screen is None:
+            self.screen = pygame.display.set_mode(self.WINDOW_SIZE)
+            pygame.display.set_caption("DOS Sprite Viewer")
+        return self.screen
+        
+    def post_file_set_loaded(self, base):
+        """Called on the loader thread: wake up the main loop"""
+        try:
+            pygame.event.post(pygame.event.Event(FILESET_LOADED, base=base))
+        except pygame.error:
+            pass  # Display already shut down
+        
+    def scan_directory(self):
+        """Scan the directory for .std files (case-insensitive)"""
+        try:
+            index = directory_index(self.directory)
+        except OSError as e:
+            print(f"Error scanning directory: {e}")
+            return False
+        self.std_files = [Path(path) for path in index.paths("std")]
+        print(f"Found {len(self.std_files)} .std files")
+        
+        # Base filenames without extensions
+        self.base_filenames = index.base_names("std")
+        
+        return len(self.std_files) > 0
+    
+    def load_file_set(self, base_filename):
+        """Load a complete set of files (.std, .inf, .map, .dat) for a given base filename"""
+        file_set = self.prefetcher.get(base_filename)
+        # This path reads the files on a miss anyway, so make sure a cached set is still current
+        if file_set is None or not file_set.is_current():
+            file_set = DOSFileSet(self.directory, base_filename, self.dat_int_size, self.dat_align).load()
+            self.prefetcher.put(file_set)
+        self.apply_file_set(file_set)
+        return file_set.success
+    
+    def apply_file_set(self, file_set):
+        """Make a loaded file set the one being viewed"""
+        self.current_file_base = file_set.base
+        self.loading_file_base = None
+        
+        self.sprites = file_set.sprites
+        self.surface_cache.clear()
+        self.layout_chunks.clear()
+        
+        # Refill the shared arrays in place, which also updates the sprites_data
+        # and anim_objects views. Sprite i is shape i % 10 of row i // 10.
+        shape_pixels = self.shape_pixels.reshape(100, 16, 16)
+        count = min(len(file_set.sprites), 100)
+        shape_pixels[:count] = file_set.sprites[:count]
+        shape_pixels[count:] = 0
+        
+        if file_set.inf is not None:
+            row_max, shapes = file_set.inf
+            self.shape_info[...] = shapes
+        else:
+            self.shape_info.fill(0)
+        
+        # Copied so editing cells doesn't touch the cached file set
+        self.layout[...] = file_set.layout if file_set.layout is not None else -1
+        
+        for name, column in self.anim_columns.items():
+            column[:] = file_set.anims[name] if file_set.anims is not None else 0
+        if file_set.inf is not None and file_set.anims is None:
+            # Without a .dat file, animation lengths come from the .inf row counts
+            n = min(len(row_max), TOTALANIMS)
+            self.anim_columns["max"][:n] = row_max[:n]
+        
+        self.current_sprite_index = 0
+        self.current_row = 0
+        self.prefetch_neighbours()
+    
+    def neighbour_file_base(self, step):
+        """Base filename `step` places away from the current one in the directory listing"""
+        file_index = self.base_filenames.index(self.current_file_base) if self.current_file_base in self.base_filenames else 0
+        return self.base_filenames[(file_index + step) % len(self.base_filenames)]
+    
+    def prefetch_neighbours(self):
+        """Have the loader thread decode the file sets around the current one, nearest first"""
+        if not self.std_files:
+            return
+        bases = []
+        for distance in range(1, self.prefetch_count + 1):
+            for step in (distance, -distance):
+                base = self.neighbour_file_base(step)
+                if base not in bases and base != self.current_file_base:
+                    bases.append(base)
+        self.prefetcher.request(bases)
+    
+    def change_file_set(self, step):
+        """Switch to a neighbouring file set, or show a loading state until the loader has it"""
+        base = self.neighbour_file_base(step)
+        file_set = self.prefetcher.get(base)
+        if file_set is not None:
+            self.apply_file_set(file_set)
+        else:
+            self.loading_file_base = base
+            self.prefetcher.request([base])
+    
+    def pixels_to_surface(self, pixels, background=None):
+        """
+        Turn a 2D array of palette indices into a surface scaled by the zoom.
+        If a background color is given, index 0 is treated as transparent and
+        shows the background instead.
+        """
+        rgb = self.palette[pixels]
+        if background is not None:
+            rgb[pixels == 0] = background
+        # surfarray is indexed [x, y], so swap the axes of the [y, x] image
+        surface = pygame.surfarray.make_surface(rgb.swapaxes(0, 1))
+        height, width = pixels.shape
+        return pygame.transform.scale(surface, (width*self.zoom, height*self.zoom))
+    
+    def sprite_surface(self, row, index, background=None):
+        """
+        Return the zoomed surface for a sprite, rendering it only on a cache miss.
+        Surfaces are shared between draw calls, so callers must not draw on them.
+        """
+        key = (self.current_file_base, row, index, self.zoom, self.palette_version, background)
+        surface = self.surface_cache.get(key)
+        if surface is None:
+            surface = self.pixels_to_surface(self.shape_pixels[row, index], background)
+            self.surface_cache.put(key, surface)
+        return surface
     
     def draw_sprite(self, row, index):
-        """Draw a single sprite at the specified row and index"""
+        """Draw a single sprite at the specified row and index, returning the rect drawn"""
         if row < 0 or row >= 10 or index < 0 or index >= 10:
-            return
+            return None
             
-        sprite = self.sprites_data[row][index].shp
-        sprite_surface = pygame.Surface((16*self.zoom, 16*self.zoom))
-        sprite_surface.fill((50, 50, 50))  # Gray background
-        
-        # Draw each pixel of the sprite, scaled up
-        for y in range(16):
-            for x in range(16):
-                color_index = int(sprite[y, x])
-                if 0 <= color_index < len(self.palette):
-                    color = self.palette[color_index]
-                    pygame.draw.rect(
-                        sprite_surface, 
-                        color, 
-                        (x*self.zoom, y*self.zoom, self.zoom, self.zoom)
-                    )
+        sprite_surface = self.sprite_surface(row, index)
         
         # Center the sprite on screen
         sprite_rect = sprite_surface.get_rect(center=(self.screen.get_width()//2, self.screen.get_height()//2))
         self.screen.blit(sprite_surface, sprite_rect)
         
-        # Draw the grid
+        # Draw the grid over the sprite, clipped to its area
+        self.screen.set_clip(sprite_rect)
         for y in range(17):
             pygame.draw.line(
-                sprite_surface,
+                self.screen,
                 (100, 100, 100),
-                (0, y*self.zoom),
-                (16*self.zoom, y*self.zoom),
+                (sprite_rect.x, sprite_rect.y + y*self.zoom),
+                (sprite_rect.x + 16*self.zoom, sprite_rect.y + y*self.zoom),
                 1
             )
         
         for x in range(17):
             pygame.draw.line(
-                sprite_surface,
+                self.screen,
                 (100, 100, 100),
-                (x*self.zoom, 0),
-                (x*self.zoom, 16*self.zoom),
+                (sprite_rect.x + x*self.zoom, sprite_rect.y),
+                (sprite_rect.x + x*self.zoom, sprite_rect.y + 16*self.zoom),
                 1
             )
-        
-        self.screen.blit(sprite_surface, sprite_rect)
+        self.screen.set_clip(None)
+        return sprite_rect
         
     def draw_sprite_grid(self):
-        """Draw all sprites in a grid"""
+        """Draw all sprites in a grid, returning the rect drawn"""
         grid_width = 16 * self.zoom * self.grid_cols
         grid_height = 16 * self.zoom * self.grid_rows
         grid_surface = pygame.Surface((grid_width, grid_height))
@@ -345,26 +599,13 @@ class DOSSpriteViewer:
                 if row >= 10 or col >= 10:  # Bounds check
                     continue
                     
-                sprite = self.sprites_data[row][col].shp
-                flag = self.sprites_data[row][col].flag
+                flag = self.shape_info["flag"][row, col]
                 
                 # Only draw sprites that have their flag set (if we're being strict)
                 # if flag == 0:
                 #     continue
                 
-                # Draw each pixel of the sprite
-                for y in range(16):
-                    for x in range(16):
-                        color_index = int(sprite[y, x])
-                        if 0 <= color_index < len(self.palette):
-                            color = self.palette[color_index]
-                            pygame.draw.rect(
-                                grid_surface, 
-                                color, 
-                                (col*16*self.zoom + x*self.zoom, 
-                                 row*16*self.zoom + y*self.zoom, 
-                                 self.zoom, self.zoom)
-                            )
+                grid_surface.blit(self.sprite_surface(row, col), (col*16*self.zoom, row*16*self.zoom))
                 
                 # Draw sprite border (red for active, gray for inactive)
                 border_color = (255, 0, 0) if flag != 0 else (100, 100, 100)
@@ -381,104 +622,209 @@ class DOSSpriteViewer:
         
         # Center the grid on screen
         grid_rect = grid_surface.get_rect(center=(self.screen.get_width()//2, self.screen.get_height()//2))
-        self.screen.blit(grid_surface, grid_rect)
+        return self.screen.blit(grid_surface, grid_rect)
+    
+    def sprite_sheet(self):
+        """Return all shapes as one (100, 16, 16) array indexed by row*10+index"""
+        return self.shape_pixels.reshape(100, 16, 16)
+    
+    def render_layout_chunk(self, cx, cy):
+        """Render one chunk of the layout, with its grid lines, at the current zoom"""
+        x0, y0 = cx * self.LAYOUT_CHUNK, cy * self.LAYOUT_CHUNK
+        cells_w = min(self.LAYOUT_CHUNK, 100 - x0)
+        cells_h = min(self.LAYOUT_CHUNK, 100 - y0)
+        tile_size = 16 * self.zoom
+        
+        # Map values are row*10+index; anything outside 0-99 is an empty cell.
+        # Gather the tiles as one image, transparent (0) showing the background.
+        pixels = layout_pixels(self.layout[x0:x0 + cells_w, y0:y0 + cells_h], self.sprite_sheet())
+        chunk = self.pixels_to_surface(pixels, background=self.LAYOUT_BACKGROUND)
+        
+        # Grid lines run along the top and left edge of every cell
+        for y in range(cells_h):
+            pygame.draw.line(chunk, self.LAYOUT_GRID_COLOR, (0, y*tile_size), (cells_w*tile_size, y*tile_size), 1)
+        for x in range(cells_w):
+            pygame.draw.line(chunk, self.LAYOUT_GRID_COLOR, (x*tile_size, 0), (x*tile_size, cells_h*tile_size), 1)
+        return chunk
+    
+    def layout_chunk(self, cx, cy):
+        """Return the pre-rendered layout chunk at (cx, cy), rendering it on a miss"""
+        key = (self.current_file_base, self.zoom, self.palette_version)
+        if key != self.layout_chunks_key:
+            self.layout_chunks.clear()
+            self.layout_chunks_key = key
+        
+        chunk = self.layout_chunks.get((cx, cy))
+        if chunk is None:
+            chunk = self.render_layout_chunk(cx, cy)
+            self.layout_chunks.put((cx, cy), chunk)
+        return chunk
+    
+    def set_layout_cell(self, x, y, map_value):
+        """Change one layout cell and redraw only that tile in the pre-rendered layout"""
+        map_value = int(map_value)
+        self.layout[x, y] = map_value
+        
+        chunk = self.layout_chunks.get((x // self.LAYOUT_CHUNK, y // self.LAYOUT_CHUNK))
+        if chunk is None:
+            return  # Not rendered yet, it will pick up the change when it is
+        
+        tile_size = 16 * self.zoom
+        pos = ((x % self.LAYOUT_CHUNK) * tile_size, (y % self.LAYOUT_CHUNK) * tile_size)
+        if 0 <= map_value < 100:
+            chunk.blit(self.sprite_surface(map_value // 10, map_value % 10, background=self.LAYOUT_BACKGROUND), pos)
+        else:
+            chunk.fill(self.LAYOUT_BACKGROUND, (pos, (tile_size, tile_size)))
+        pygame.draw.line(chunk, self.LAYOUT_GRID_COLOR, pos, (pos[0] + tile_size, pos[1]), 1)
+        pygame.draw.line(chunk, self.LAYOUT_GRID_COLOR, pos, (pos[0], pos[1] + tile_size), 1)
     
     def draw_layout(self, x_offset=0, y_offset=0):
-        """Draw the layout view from the .map file"""
+        """Draw the layout view from the .map file, returning the rect drawn"""
         visible_width = min(20, 100 - x_offset)
         visible_height = min(15, 100 - y_offset)
         
-        layout_width = visible_width * 16 * self.zoom
-        layout_height = visible_height * 16 * self.zoom
+        tile_size = 16 * self.zoom
+        layout_width = visible_width * tile_size
+        layout_height = visible_height * tile_size
         
-        layout_surface = pygame.Surface((layout_width, layout_height))
-        layout_surface.fill((40, 40, 40))  # Dark gray background
+        # Center the layout on screen; only the part that is on screen gets drawn
+        layout_rect = pygame.Rect(0, 0, layout_width, layout_height)
+        layout_rect.center = (self.screen.get_width()//2, self.screen.get_height()//2)
+        visible_rect = layout_rect.clip(self.screen.get_rect())
+        if visible_rect.width == 0 or visible_rect.height == 0:
+            return None
         
-        for y in range(visible_height):
-            for x in range(visible_width):
-                map_value = self.layout[x + x_offset][y + y_offset]
-                
-                if map_value >= 0:
-                    # Extract row and sprite index from map value
-                    row = map_value // 10
-                    sprite_idx = map_value % 10
-                    
-                    if row < 10 and sprite_idx < 10:  # Bounds check
-                        sprite = self.sprites_data[row][sprite_idx].shp
-                        
-                        # Draw the sprite
-                        for sy in range(16):
-                            for sx in range(16):
-                                color_index = int(sprite[sy][sx])
-                                if color_index > 0 and color_index < len(self.palette):  # Skip transparent (0)
-                                    color = self.palette[color_index]
-                                    pygame.draw.rect(
-                                        layout_surface,
-                                        color,
-                                        (x*16*self.zoom + sx*self.zoom,
-                                         y*16*self.zoom + sy*self.zoom,
-                                         self.zoom, self.zoom)
-                                    )
-        
-        # Draw grid lines
-        for y in range(visible_height + 1):
-            pygame.draw.line(
-                layout_surface,
-                (60, 60, 60),
-                (0, y*16*self.zoom),
-                (layout_width, y*16*self.zoom),
-                1
-            )
+        # Visible area in whole-map pixel coordinates
+        left = x_offset * tile_size + (visible_rect.x - layout_rect.x)
+        top = y_offset * tile_size + (visible_rect.y - layout_rect.y)
+        chunk_size = self.LAYOUT_CHUNK * tile_size
         
-        for x in range(visible_width + 1):
-            pygame.draw.line(
-                layout_surface,
-                (60, 60, 60),
-                (x*16*self.zoom, 0),
-                (x*16*self.zoom, layout_height),
-                1
-            )
+        # Blit the chunks overlapping the viewport
+        self.screen.set_clip(visible_rect)
+        for cy in range(top // chunk_size, (top + visible_rect.height - 1) // chunk_size + 1):
+            for cx in range(left // chunk_size, (left + visible_rect.width - 1) // chunk_size + 1):
+                self.screen.blit(
+                    self.layout_chunk(cx, cy),
+                    (layout_rect.x + cx*chunk_size - x_offset*tile_size,
+                     layout_rect.y + cy*chunk_size - y_offset*tile_size)
+                )
+        self.screen.set_clip(None)
+        return visible_rect
+        
+    def playing_animations(self):
+        """(object index, shape row, frame count, ms per frame) of each animation to play"""
+        active = [i for i, obj in enumerate(self.anim_objects) if obj.active]
+        anims = []
+        for i in (active or range(TOTALANIMS)):
+            obj = self.anim_objects[i]
+            # Without active objects from a .dat file, preview every shape row
+            row = obj.row if active else i
+            if not 0 <= row < 10:
+                continue
+            frames = min(max(obj.max, 0) + 1, 10)
+            anims.append((i, row, frames, max(obj.animspeed, 1) * self.ANIM_TICK_MS))
+        return anims
+    
+    def animation_strip(self, row, frames):
+        """Return the first `frames` shapes of a row pre-rendered side by side in one surface"""
+        key = (self.current_file_base, "strip", row, frames, self.zoom, self.palette_version)
+        strip = self.surface_cache.get(key)
+        if strip is None:
+            size = 16 * self.zoom
+            strip = pygame.Surface((frames * size, size))
+            for frame in range(frames):
+                strip.blit(self.sprite_surface(row, frame), (frame * size, 0))
+            self.surface_cache.put(key, strip)
+        return strip
+    
+    def animation_frame(self, frames, frame_ms):
+        """Frame an animation is on right now, going by the monotonic clock"""
+        elapsed_ms = (time.monotonic() - self.anim_start) * 1000
+        return int(elapsed_ms // frame_ms) % frames
+    
+    def ms_to_next_anim_frame(self):
+        """Milliseconds until the next frame change of any playing animation"""
+        elapsed_ms = (time.monotonic() - self.anim_start) * 1000
+        return max(1, int(min(frame_ms - elapsed_ms % frame_ms for _, _, _, frame_ms, _ in self.anim_cells)) + 1)
+    
+    def draw_animations(self):
+        """Lay out all playing animations, each showing its current frame, returning the rect drawn"""
+        anims = self.playing_animations()
+        size = 16 * self.zoom
+        cell_width = max(size + 20, 110)
+        cell_height = size + 30
+        # Up to 5 per row, fewer when zoomed in so the cells stay on screen
+        cols = max(1, min(5, self.screen.get_width() // cell_width))
+        area = pygame.Rect(0, 0, cols * cell_width, -(-len(anims) // cols) * cell_height)
+        area.center = (self.screen.get_width()//2, self.screen.get_height()//2)
         
-        # Center the layout on screen
-        layout_rect = layout_surface.get_rect(center=(self.screen.get_width()//2, self.screen.get_height()//2))
-        self.screen.blit(layout_surface, layout_rect)
+        self.anim_cells = []
+        for n, (i, row, frames, frame_ms) in enumerate(anims):
+            cell_row, cell_col = divmod(n, cols)
+            x = area.x + cell_col * cell_width + (cell_width - size) // 2
+            y = area.y + cell_row * cell_height + 5
+            label = self.font.render(f"Obj {i}, row {row}", True, (200, 200, 200))
+            self.screen.blit(label, label.get_rect(midtop=(x + size // 2, y + size + 4)))
+            self.anim_cells.append([pygame.Rect(x, y, size, size), self.animation_strip(row, frames), frames, frame_ms, None])
         
+        self.update_animations()
+        return area
+    
+    def update_animations(self):
+        """Blit the frames that changed since they were last shown, straight from the strips"""
+        rects = []
+        for cell in self.anim_cells:
+            rect, strip, frames, frame_ms, shown = cell
+            frame = self.animation_frame(frames, frame_ms)
+            if frame != shown:
+                self.screen.blit(strip, rect, area=(frame * rect.width, 0, rect.width, rect.height))
+                cell[4] = frame
+                rects.append(rect)
+        return rects
+    
     def draw_info(self):
-        """Draw information about the current sprite and controls"""
+        """Draw information about the current sprite and controls, returning the rects drawn"""
+        rects = []
         if self.current_file_base:
             # File info
             file_info = f"File: {self.current_file_base}"
             file_text = self.font.render(file_info, True, (255, 255, 255))
-            self.screen.blit(file_text, (10, 10))
+            rects.append(self.screen.blit(file_text, (10, 10)))
             
             # Mode info
             mode_info = f"Mode: {self.view_mode.capitalize()}"
             mode_text = self.font.render(mode_info, True, (255, 255, 255))
-            self.screen.blit(mode_text, (10, 30))
+            rects.append(self.screen.blit(mode_text, (10, 30)))
+            
+            if self.loading_file_base:
+                loading_text = self.font.render(f"Loading {self.loading_file_base}...", True, (255, 255, 0))
+                rects.append(self.screen.blit(loading_text, (300, 10)))
             
             # Sprite/Row info
             if self.view_mode == "sprite":
                 sprite_info = f"Row: {self.current_row}, Sprite: {self.current_sprite_index} " + \
-                              f"(Flag: {self.sprites_data[self.current_row][self.current_sprite_index].flag})"
+                              f"(Flag: {self.shape_info['flag'][self.current_row, self.current_sprite_index]})"
                 sprite_text = self.font.render(sprite_info, True, (255, 255, 255))
-                self.screen.blit(sprite_text, (10, 50))
+                rects.append(self.screen.blit(sprite_text, (10, 50)))
             
             # Help text
             help_texts = [
                 "Left/Right: Change sprite",
                 "Up/Down: Change row",
                 "PgUp/PgDn: Change file",
-                "Tab: Cycle view modes (sprite/grid/layout)",
+                "Tab: Cycle view modes (sprite/grid/layout/anim)",
                 "+/-: Zoom in/out",
                 "L: Load another file",
+                "F3: Toggle profiling overlay",
                 "Esc: Quit"
             ]
             
             y_pos = self.screen.get_height() - len(help_texts) * 20 - 10
             for text in help_texts:
                 rendered_text = self.font.render(text, True, (200, 200, 200))
-                self.screen.blit(rendered_text, (10, y_pos))
+                rects.append(self.screen.blit(rendered_text, (10, y_pos)))
                 y_pos += 20
+        return rects
     
     def prompt_for_file(self):
         """Prompt the user to enter a file basename"""
@@ -492,126 +838,283 @@ class DOSSpriteViewer:
         
         input_text = ""
         input_active = True
+        deferred = []  # Other events (e.g. FILESET_LOADED), handed back to the main loop
         
-        while input_active:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    return None
-                elif event.type == KEYDOWN:
-                    if event.key == K_RETURN:
-                        input_active = False
-                    elif event.key == K_ESCAPE:
+        try:
+            while input_active:
+                # Sleep until there is input instead of polling
+                for event in [pygame.event.wait()] + pygame.event.get():
+                    if event.type == QUIT:
                         return None
-                    elif event.key == K_BACKSPACE:
-                        input_text = input_text[:-1]
+                    elif event.type == KEYDOWN:
+                        if event.key == K_RETURN:
+                            input_active = False
+                        elif event.key == K_ESCAPE:
+                            return None
+                        elif event.key == K_BACKSPACE:
+                            input_text = input_text[:-1]
+                        else:
+                            input_text += event.unicode
                     else:
-                        input_text += event.unicode
-            
-            # Clear the input area
-            pygame.draw.rect(self.screen, (0, 0, 0), (120, 350, 784, 30))
-            
-            # Render the current input text
-            input_surface = self.font.render(input_text, True, (255, 255, 255))
-            self.screen.blit(input_surface, (120, 350))
-            
-            pygame.display.flip()
-            self.clock.tick(30)
+                        deferred.append(event)
+                
+                # Clear the input area
+                pygame.draw.rect(self.screen, (0, 0, 0), (120, 350, 784, 30))
+                
+                # Render the current input text
+                input_surface = self.font.render(input_text, True, (255, 255, 255))
+                self.screen.blit(input_surface, (120, 350))
+                
+                pygame.display.update((120, 350, 784, 30))
+        finally:
+            for event in deferred:
+                pygame.event.post(event)
         
         return input_text
                     
-    def run(self):
-        """Main application loop"""
+    def handle_event(self, event):
+        """Apply one input event. Returns True if the view needs to be redrawn."""
+        if event.type == QUIT:
+            self.running = False
+        elif event.type == VIDEOEXPOSE:
+            # Window contents were lost, so repaint all of it
+            self.drawn_rects = [self.screen.get_rect()]
+            return True
+        elif event.type == FILESET_LOADED:
+            # Show the file set we were waiting for, if the user hasn't moved on
+            if event.base == self.loading_file_base:
+                self.apply_file_set(self.prefetcher.get(event.base) or
+                                    DOSFileSet(self.directory, event.base, self.dat_int_size, self.dat_align).load())
+                return True
+        elif event.type == KEYDOWN:
+            if event.key == K_ESCAPE:
+                self.running = False
+            elif event.key == K_TAB:
+                # Cycle view modes
+                if self.view_mode == "sprite":
+                    self.view_mode = "grid"
+                elif self.view_mode == "grid":
+                    self.view_mode = "layout"
+                elif self.view_mode == "layout":
+                    self.view_mode = "anim"
+                    self.anim_start = time.monotonic()
+                else:
+                    self.view_mode = "sprite"
+            elif event.key == K_l:
+                # Load another file
+                filename = self.prompt_for_file()
+                if filename:
+                    self.load_file_set(filename)
+                # The prompt drew over the screen
+                self.drawn_rects = [self.screen.get_rect()]
+            elif event.key == K_RIGHT:
+                if self.view_mode == "sprite":
+                    self.current_sprite_index = (self.current_sprite_index + 1) % 10
+                elif self.view_mode == "layout":
+                    self.layout_x_offset = min(self.layout_x_offset + 1, 80)
+            elif event.key == K_LEFT:
+                if self.view_mode == "sprite":
+                    self.current_sprite_index = (self.current_sprite_index - 1) % 10
+                elif self.view_mode == "layout":
+                    self.layout_x_offset = max(self.layout_x_offset - 1, 0)
+            elif event.key == K_DOWN:
+                if self.view_mode == "sprite":
+                    self.current_row = (self.current_row + 1) % 10
+                elif self.view_mode == "layout":
+                    self.layout_y_offset = min(self.layout_y_offset + 1, 85)
+            elif event.key == K_UP:
+                if self.view_mode == "sprite":
+                    self.current_row = (self.current_row - 1) % 10
+                elif self.view_mode == "layout":
+                    self.layout_y_offset = max(self.layout_y_offset - 1, 0)
+            elif event.key == K_PAGEUP:
+                # Go to previous file
+                if self.std_files:
+                    self.change_file_set(-1)
+            elif event.key == K_PAGEDOWN:
+                # Go to next file
+                if self.std_files:
+                    self.change_file_set(1)
+            elif event.key == K_F3:
+                self.show_profiler = not self.show_profiler
+            elif event.key in (K_PLUS, K_EQUALS):
+                # Zoom in
+                self.zoom = min(16, self.zoom + 1)
+            elif event.key == K_MINUS:
+                # Zoom out
+                self.zoom = max(1, self.zoom - 1)
+            return True
+        return False
+    
+    def draw_profiler(self):
+        """Draw the frame time, per-stage times and frame time histogram, returning the panel rect"""
+        profiler = self.profiler
+        frames = profiler.frames
+        lines = []
+        if frames:
+            lines.append(f"Frame: {frames[-1]:.1f} ms (avg {sum(frames) / len(frames):.1f}, "
+                         f"max {max(frames):.1f}, {len(frames)} frames)")
+        for name, last, mean in profiler.stage_stats():
+            lines.append(f"  {name}: {last:.2f} ms (avg {mean:.2f})")
+        
+        line_height = 18
+        hist_height = 50
+        panel = pygame.Rect(self.screen.get_width() - 330, 10, 320, len(lines) * line_height + hist_height + 40)
+        pygame.draw.rect(self.screen, (0, 0, 0), panel)
+        pygame.draw.rect(self.screen, (100, 100, 100), panel, 1)
+        
+        y_pos = panel.y + 5
+        for line in lines:
+            self.screen.blit(self.font.render(line, True, (255, 255, 255)), (panel.x + 10, y_pos))
+            y_pos += line_height
+        
+        # Histogram of frame times, green within 60 fps, yellow within 30 fps, red beyond
+        counts = profiler.histogram()
+        bar_width = (panel.width - 20) // len(counts)
+        tallest = max(max(counts), 1)
+        base_y = y_pos + 5 + hist_height
+        for i, count in enumerate(counts):
+            bin_ms = i * profiler.HISTOGRAM_BIN_MS
+            color = (0, 200, 0) if bin_ms < 16 else (200, 200, 0) if bin_ms < 33 else (200, 0, 0)
+            height = count * hist_height // tallest
+            if height:
+                pygame.draw.rect(self.screen, color, (panel.x + 10 + i * bar_width, base_y - height, bar_width - 1, height))
+        last_bin = (profiler.HISTOGRAM_BINS - 1) * profiler.HISTOGRAM_BIN_MS
+        axis_text = self.font.render(f"0 ms  ...  {last_bin}+ ms", True, (200, 200, 200))
+        self.screen.blit(axis_text, (panel.x + 10, base_y + 2))
+        return panel
+    
+    def draw_frame(self):
+        """Redraw the view, returning the screen rects that changed since the last frame"""
+        # Clear what the previous frame drew
+        with self.profiler.stage("clear"):
+            for rect in self.drawn_rects:
+                self.screen.fill(self.background, rect)
+        
+        # Draw content based on view mode
+        rects = []
+        if self.view_mode == "sprite":
+            with self.profiler.stage("draw_sprite"):
+                rects.append(self.draw_sprite(self.current_row, self.current_sprite_index))
+        elif self.view_mode == "grid":
+            with self.profiler.stage("draw_sprite_grid"):
+                rects.append(self.draw_sprite_grid())
+        elif self.view_mode == "layout":
+            with self.profiler.stage("draw_layout"):
+                rects.append(self.draw_layout(self.layout_x_offset, self.layout_y_offset))
+        elif self.view_mode == "anim":
+            with self.profiler.stage("draw_animations"):
+                rects.append(self.draw_animations())
+            
+        # Draw information
+        with self.profiler.stage("draw_info"):
+            rects.extend(self.draw_info())
+        if self.show_profiler:
+            with self.profiler.stage("draw_profiler"):
+                rects.append(self.draw_profiler())
+        rects = [rect for rect in rects if rect is not None]
+        
+        dirty = self.drawn_rects + rects
+        self.drawn_rects = rects
+        return dirty
+                    
+    def start(self):
+        """
+        Scan the directory, load the first file set and show it, recording the
+        time to first frame in first_frame_ms. Returns False if there is nothing to show.
+        """
         if not self.scan_directory():
             print("No .std files found in the directory")
-            return
+            return False
             
         if self.std_files:
-            self.load_file_set(self.std_files[0].stem)
+            self.load_file_set(self.base_filenames[0])
             
-        layout_x_offset = 0
-        layout_y_offset = 0
-        running = True
-        
-        while running:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    running = False
-                elif event.type == KEYDOWN:
-                    if event.key == K_ESCAPE:
-                        running = False
-                    elif event.key == K_TAB:
-                        # Cycle view modes
-                        if self.view_mode == "sprite":
-                            self.view_mode = "grid"
-                        elif self.view_mode == "grid":
-                            self.view_mode = "layout"
-                        else:
-                            self.view_mode = "sprite"
-                    elif event.key == K_l:
-                        # Load another file
-                        filename = self.prompt_for_file()
-                        if filename:
-                            self.load_file_set(filename)
-                    elif event.key == K_RIGHT:
-                        if self.view_mode == "sprite":
-                            self.current_sprite_index = (self.current_sprite_index + 1) % 10
-                        elif self.view_mode == "layout":
-                            layout_x_offset = min(layout_x_offset + 1, 80)
-                    elif event.key == K_LEFT:
-                        if self.view_mode == "sprite":
-                            self.current_sprite_index = (self.current_sprite_index - 1) % 10
-                        elif self.view_mode == "layout":
-                            layout_x_offset = max(layout_x_offset - 1, 0)
-                    elif event.key == K_DOWN:
-                        if self.view_mode == "sprite":
-                            self.current_row = (self.current_row + 1) % 10
-                        elif self.view_mode == "layout":
-                            layout_y_offset = min(layout_y_offset + 1, 85)
-                    elif event.key == K_UP:
-                        if self.view_mode == "sprite":
-                            self.current_row = (self.current_row - 1) % 10
-                        elif self.view_mode == "layout":
-                            layout_y_offset = max(layout_y_offset - 1, 0)
-                    elif event.key == K_PAGEUP:
-                        # Go to previous file
-                        if self.std_files:
-                            file_index = self.base_filenames.index(self.current_file_base) if self.current_file_base in self.base_filenames else 0
-                            new_index = (file_index - 1) % len(self.base_filenames)
-                            self.load_file_set(self.base_filenames[new_index])
-                    elif event.key == K_PAGEDOWN:
-                        # Go to next file
-                        if self.std_files:
-                            file_index = self.base_filenames.index(self.current_file_base) if self.current_file_base in self.base_filenames else 0
-                            new_index = (file_index + 1) % len(self.base_filenames)
-                            self.load_file_set(self.base_filenames[new_index])
-                    elif event.key in (K_PLUS, K_EQUALS):
-                        # Zoom in
-                        self.zoom = min(16, self.zoom + 1)
-                    elif event.key == K_MINUS:
-                        # Zoom out
-                        self.zoom = max(1, self.zoom - 1)
-                        
-            # Draw background
-            self.screen.fill((30, 30, 30))
+        self.open_window()
+        self.screen.fill(self.background)
+        self.draw_frame()
+        pygame.display.flip()
+        
+        self.first_frame_ms = (time.perf_counter() - self.started) * 1000
+        if self.first_frame_ms > self.FIRST_FRAME_BUDGET_MS:
+            print(f"Warning: first frame took {self.first_frame_ms:.0f} ms "
+                  f"(budget {self.FIRST_FRAME_BUDGET_MS} ms)")
+        return True
+        
+    def run(self):
+        """Main application loop, redrawing only after input and sleeping while idle"""
+        if not self.start():
+            pygame.quit()
+            return
             
-            # Draw content based on view mode
-            if self.view_mode == "sprite":
-                self.draw_sprite(self.current_row, self.current_sprite_index)
-            elif self.view_mode == "grid":
-                self.draw_sprite_grid()
-            elif self.view_mode == "layout":
-                self.draw_layout(layout_x_offset, layout_y_offset)
-                
-            # Draw information
-            self.draw_info()
+        self.running = True
+        needs_redraw = False
+        
+        while self.running:
+            # Block until something happens, unless a frame is already pending.
+            # While animations play, wake up in time for the next frame change.
+            if needs_redraw:
+                events = pygame.event.get()
+            elif self.view_mode == "anim" and self.anim_cells:
+                event = pygame.event.wait(self.ms_to_next_anim_frame())
+                events = ([] if event.type == NOEVENT else [event]) + pygame.event.get()
+            else:
+                events = [pygame.event.wait()] + pygame.event.get()
+            with self.profiler.stage("events"):
+                for event in events:
+                    needs_redraw |= self.handle_event(event)
             
-            pygame.display.flip()
-            self.clock.tick(30)
+            if needs_redraw and self.running:
+                dirty = self.draw_frame()
+                with self.profiler.stage("display_update"):
+                    pygame.display.update(dirty)
+                self.profiler.end_frame()
+                needs_redraw = False
+            elif self.view_mode == "anim" and self.running:
+                # Only the animation cells whose frame changed
+                with self.profiler.stage("update_animations"):
+                    rects = self.update_animations()
+                if rects:
+                    if self.show_profiler:
+                        with self.profiler.stage("draw_profiler"):
+                            rects.append(self.draw_profiler())
+                    with self.profiler.stage("display_update"):
+                        pygame.display.update(rects)
+                    self.profiler.end_frame()
             
+        self.prefetcher.stop()
         pygame.quit()
         
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="View .std sprite sets with their .inf, .map and .dat files")
+    parser.add_argument("directory", nargs="?", default=".", help="directory to scan (default: current directory)")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile and print the slowest calls on exit")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="with --profile, also save the stats to FILE for pstats/snakeviz")
+    args = parser.parse_args(argv)
+    if args.profile_out and not args.profile:
+        parser.error("--profile-out needs --profile")
+    
+    viewer = DOSSpriteViewer(args.directory, started=STARTED)
+    if not args.profile:
+        viewer.run()
+        return
+    
+    import cProfile
+    import pstats
+    profile = cProfile.Profile()
+    try:
+        profile.runcall(viewer.run)
+    finally:
+        # Printed first, so the numbers are there even if saving them fails
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(30)
+        if args.profile_out:
+            try:
+                profile.dump_stats(args.profile_out)
+                print(f"Saved profile to {args.profile_out}")
+            except OSError as e:
+                print(f"Error saving profile: {e}")
+        
 if __name__ == "__main__":
-    # Use command line argument for directory if provided, otherwise use current directory
-    directory = sys.argv[1] if len(sys.argv) > 1 else "."
-    viewer = DOSSpriteViewer(directory)
-    viewer.run()
+    main()
@@ -1,9 +1,14 @@
 import os
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image
-import tempfile
-import io
+import numpy as np
+from PIL import Image, ImageDraw
+
+from file_index import directory_index
+from std_decoder import SPRITE_BYTES, VGA16_PALETTE, decode_std, open_std, to_rgb
+from thumbnail_cache import ThumbnailCache
 
 class STDViewer(tk.Tk):
     def __init__(self):
@@ -11,12 +16,37 @@ class STDViewer(tk.Tk):
         self.title("STD File Viewer")
         self.geometry("900x700")
         
-        # Store loaded images and file info
-        self.images = []
-        self.photo_images = []
+        # Store loaded thumbnails (16x16 RGB arrays) and file info
+        self.thumbnails = []
         self.current_files = []
+        
+        # Virtualized grid view: canvas items exist only for visible cells.
+        # grid_items maps a thumbnail index to its (image item, text item, PhotoImage),
+        # and grid_free_items holds hidden item pairs ready to be reused.
+        self.grid_items = {}
+        self.grid_free_items = []
+        self.grid_cols = 5  # Number of images per row
+        self.grid_cell_width = 120
+        self.grid_cell_height = 100
+        self.grid_zoom = 4  # 16x16 thumbnails are shown at 64x64
+        self.grid_overscan = 2  # Rows kept beyond the visible area
         self.sheet_photo_refs = []
-        self.temp_files = []  # To track temporary files
+        self.sheet_file = None  # File picked for the Sprite Sheet tab
+        self.sheet_shown_file = None  # File the sheet was last built for
+        self.thumbnail_cache = ThumbnailCache()
+        
+        # Background thumbnail loading
+        self.scan_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        self.scan_queue = queue.Queue()
+        self.scan_generation = 0
+        self.scan_futures = []
+        self.scan_files = []
+        self.scan_results = {}
+        self.scan_next = 0
+        self.scan_poll_id = None
+        self.scan_chunk_size = 64  # Files per worker job
+        self.scan_batch_size = 1000  # Thumbnails added to the UI per poll
+        self.scan_poll_ms = 15
         
         # Create UI elements
         self.create_widgets()
@@ -37,6 +67,7 @@ class STDViewer(tk.Tk):
         # Create a notebook for tabs
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Create first tab for image grid view
         self.grid_frame = tk.Frame(self.notebook)
@@ -50,16 +81,12 @@ class STDViewer(tk.Tk):
         self.scrollbar_y = tk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         self.scrollbar_x = tk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
         
-        self.canvas.configure(yscrollcommand=self.scrollbar_y.set, xscrollcommand=self.scrollbar_x.set)
+        self.canvas.configure(yscrollcommand=self.on_grid_yview, xscrollcommand=self.scrollbar_x.set)
         
         self.scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
         self.scrollbar_x.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        # Create a frame inside the canvas for image display
-        self.image_frame = tk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.image_frame, anchor=tk.NW)
-        
         # Create second tab for sprite sheet view of a single file
         self.sheet_frame = tk.Frame(self.notebook)
         self.notebook.add(self.sheet_frame, text="Sprite Sheet View")
@@ -97,12 +124,68 @@ class STDViewer(tk.Tk):
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
         # Configure canvas scrolling
-        self.image_frame.bind("<Configure>", self.on_frame_configure)
+        self.canvas.bind("<Configure>", self.on_grid_canvas_configure)
         self.sheet_canvas.bind("<Configure>", self.on_sheet_canvas_configure)
         
-    def on_frame_configure(self, event):
-        # Update the scroll region to encompass the inner frame
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+    def on_grid_canvas_configure(self, event):
+        # More or fewer rows may be visible now
+        self.update_visible_thumbnails()
+        
+    def on_grid_yview(self, first, last):
+        # Called by the canvas whenever the grid scrolls
+        self.scrollbar_y.set(first, last)
+        self.update_visible_thumbnails()
+        
+    def update_grid_scrollregion(self):
+        rows = -(-len(self.thumbnails) // self.grid_cols)
+        self.canvas.configure(scrollregion=(0, 0, self.grid_cols * self.grid_cell_width, rows * self.grid_cell_height))
+        
+    def update_visible_thumbnails(self):
+        """Create canvas items for the visible grid rows (plus overscan) and recycle the rest"""
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first_row = max(0, int(top // self.grid_cell_height) - self.grid_overscan)
+        last_row = int(bottom // self.grid_cell_height) + self.grid_overscan
+        first = first_row * self.grid_cols
+        last = min(len(self.thumbnails), (last_row + 1) * self.grid_cols)
+        
+        # Recycle items that scrolled out of range
+        for index in [i for i in self.grid_items if i < first or i >= last]:
+            image_item, text_item, _ = self.grid_items.pop(index)
+            self.canvas.itemconfigure(image_item, image="", state=tk.HIDDEN)
+            self.canvas.itemconfigure(text_item, state=tk.HIDDEN)
+            self.grid_free_items.append((image_item, text_item))
+        
+        # Fill in cells that came into range
+        for index in range(first, last):
+            if index in self.grid_items:
+                continue
+            row, col = divmod(index, self.grid_cols)
+            x = col * self.grid_cell_width + self.grid_cell_width // 2
+            y = row * self.grid_cell_height + 5
+            photo = self.rgb_to_photo(self.thumbnails[index], zoom=self.grid_zoom)
+            filename = os.path.basename(self.current_files[index])
+            
+            if self.grid_free_items:
+                image_item, text_item = self.grid_free_items.pop()
+                self.canvas.coords(image_item, x, y)
+                self.canvas.coords(text_item, x, y + 16 * self.grid_zoom + 4)
+                self.canvas.itemconfigure(image_item, image=photo, state=tk.NORMAL)
+                self.canvas.itemconfigure(text_item, text=filename, state=tk.NORMAL)
+            else:
+                image_item = self.canvas.create_image(x, y, image=photo, anchor=tk.N)
+                text_item = self.canvas.create_text(x, y + 16 * self.grid_zoom + 4, text=filename, anchor=tk.N,
+                                                    width=self.grid_cell_width - 10)
+            # Keep a reference to the PhotoImage while it is shown
+            self.grid_items[index] = (image_item, text_item, photo)
+    
+    def clear_grid(self):
+        self.canvas.delete("all")
+        self.grid_items = {}
+        self.grid_free_items = []
+        self.thumbnails = []
+        self.canvas.yview_moveto(0)
+        self.update_grid_scrollregion()
         
     def on_sheet_canvas_configure(self, event):
         # Update the scroll region for sheet canvas
@@ -114,164 +197,195 @@ class STDViewer(tk.Tk):
             self.lbl_dir.config(text=directory)
             self.scan_directory(directory)
     
-    def cleanup_temp_files(self):
-        """Clean up any temporary files we created"""
-        for temp_file in self.temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception as e:
-                print(f"Error removing temp file {temp_file}: {e}")
-        self.temp_files = []
-    
-    def pil_to_tkimage(self, pil_image):
-        """Convert PIL Image to Tkinter PhotoImage without ImageTk"""
-        # Create a temporary file for the image
-        with tempfile.NamedTemporaryFile(suffix='.gif', delete=False) as temp_file:
-            temp_filename = temp_file.name
-            self.temp_files.append(temp_filename)
-            
-        # Save the PIL image as GIF (with transparency)
-        pil_image.save(temp_filename, 'GIF')
-        
-        # Open with Tkinter's PhotoImage
-        photo = tk.PhotoImage(file=temp_filename)
+    def rgb_to_photo(self, rgb, zoom=1):
+        """
+        Convert an (h, w, 3) uint8 RGB array to a Tkinter PhotoImage in memory,
+        passing it to Tk as binary PPM data and scaling it up with PhotoImage.zoom
+        """
+        height, width = rgb.shape[:2]
+        ppm = b"P6 %d %d 255\n" % (width, height) + np.ascontiguousarray(rgb, dtype=np.uint8).tobytes()
+        photo = tk.PhotoImage(data=ppm, format="PPM")
+        if zoom != 1:
+            photo = photo.zoom(zoom)
         return photo
     
     def scan_directory(self, directory):
-        # Clear previous images
-        for widget in self.image_frame.winfo_children():
-            widget.destroy()
-        
-        # Clean up previous temp files
-        self.cleanup_temp_files()
+        # Stop any scan that is still running
+        self.cancel_scan()
         
-        # Clear previous references to ensure proper garbage collection
-        self.images = []
-        self.photo_images = []
+        # Clear previous images, dropping references to ensure proper garbage collection
+        self.clear_grid()
         self.current_files = []
         self.sheet_photo_refs = []
+        self.sheet_file = None
+        self.sheet_shown_file = None
+        self.sheet_canvas.delete("all")
+        self.file_dropdown['values'] = []
         
-        # Find all .STD files
-        std_files = []
-        for file in os.listdir(directory):
-            if file.lower().endswith('.std'):
-                std_files.append(os.path.join(directory, file))
+        # Find all .STD files (any case) in one pass over the directory
+        std_files = directory_index(directory).paths("std")
         
         if not std_files:
             messagebox.showinfo("No Files", "No .STD files found in the selected directory")
             self.status_var.set("No .STD files found")
-            self.file_dropdown['values'] = []
             return
         
         self.status_var.set(f"Found {len(std_files)} .STD files. Processing...")
-        self.update()
-        
-        # Process each STD file
-        row, col = 0, 0
-        max_cols = 5  # Number of images per row
         
-        for std_file in std_files:
+        # Decode thumbnails on the worker pool, in chunks so the first ones arrive quickly.
+        # Results come back through scan_queue and are shown by poll_scan_results.
+        self.scan_files = std_files
+        self.scan_results = {}
+        self.scan_next = 0
+        generation = self.scan_generation
+        for start in range(0, len(std_files), self.scan_chunk_size):
+            self.scan_futures.append(self.scan_executor.submit(
+                self.load_thumbnails, generation, start, std_files[start:start + self.scan_chunk_size]))
+        self.poll_scan_results()
+    
+    def cancel_scan(self):
+        """Cancel the running directory scan, if any"""
+        # Workers check the generation and stop; anything they already queued is ignored
+        self.scan_generation += 1
+        for future in self.scan_futures:
+            future.cancel()
+        self.scan_futures = []
+        self.scan_files = []
+        if self.scan_poll_id is not None:
+            self.after_cancel(self.scan_poll_id)
+            self.scan_poll_id = None
+    
+    def load_thumbnails(self, generation, start, std_files):
+        """Worker: decode the thumbnails of a chunk of files"""
+        for index, std_file in enumerate(std_files, start):
+            if generation != self.scan_generation:
+                return  # Cancelled
+            img = None
             try:
-                # Extract first image from STD file
                 img = self.extract_first_image(std_file)
-                if img:
-                    # Store the file path
-                    self.current_files.append(std_file)
-                    
-                    # Scale up the image for better visibility
-                    img_scaled = img.resize((64, 64), Image.NEAREST)
-                    
-                    # Convert to tkinter PhotoImage
-                    photo = self.pil_to_tkimage(img_scaled)
-                    self.photo_images.append(photo)  # Keep a reference
-                    
-                    # Create a frame for the image and its label
-                    img_container = tk.Frame(self.image_frame, padx=5, pady=5)
-                    img_container.grid(row=row, column=col, padx=5, pady=5)
-                    
-                    # Display the image
-                    img_label = tk.Label(img_container, image=photo)
-                    img_label.pack()
-                    
-                    # Display the filename
-                    filename = os.path.basename(std_file)
-                    text_label = tk.Label(img_container, text=filename)
-                    text_label.pack()
-                    
-                    # Update grid position
-                    col += 1
-                    if col >= max_cols:
-                        col = 0
-                        row += 1
             except Exception as e:
                 print(f"Error processing {std_file}: {e}")
-        
-        # Update the grid layout after processing all files
-        self.image_frame.update_idletasks()
-        
-        # Update the file dropdown
-        self.file_dropdown['values'] = [os.path.basename(f) for f in self.current_files]
-        if self.current_files:
-            self.file_dropdown.current(0)
-            self.on_file_selected(None)
+            self.scan_queue.put((generation, index, img))
+    
+    def poll_scan_results(self):
+        """Show thumbnails finished by the workers, in file order, a batch at a time"""
+        self.scan_poll_id = None
+        while True:
+            try:
+                generation, index, img = self.scan_queue.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.scan_generation:
+                self.scan_results[index] = img
+        
+        added = 0
+        while self.scan_next in self.scan_results and added < self.scan_batch_size:
+            img = self.scan_results.pop(self.scan_next)
+            std_file = self.scan_files[self.scan_next]
+            self.scan_next += 1
+            if img is not None:
+                self.thumbnails.append(img)
+                self.current_files.append(std_file)
+                added += 1
+        
+        if added:
+            # Only the rows in view get canvas items
+            self.update_grid_scrollregion()
+            self.update_visible_thumbnails()
             
-        self.status_var.set(f"Loaded {len(self.photo_images)} images from {len(std_files)} .STD files")
+            # Update the file dropdown
+            self.file_dropdown['values'] = [os.path.basename(f) for f in self.current_files]
+            if len(self.current_files) == added:
+                self.file_dropdown.current(0)
+                self.on_file_selected(None)
+        
+        if self.scan_next < len(self.scan_files):
+            self.status_var.set(f"Loading thumbnails... {self.scan_next} of {len(self.scan_files)} .STD files")
+            self.scan_poll_id = self.after(self.scan_poll_ms, self.poll_scan_results)
+        else:
+            # Save newly read thumbnails for the next scan
+            self.thumbnail_cache.commit()
+            self.scan_futures = []
+            self.status_var.set(f"Loaded {len(self.thumbnails)} images from {len(self.scan_files)} .STD files")
+    
+    def destroy(self):
+        self.cancel_scan()
+        self.scan_executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
     
     def on_file_selected(self, event):
         selected_file = self.file_var.get()
         if selected_file:
             file_path = next((f for f in self.current_files if os.path.basename(f) == selected_file), None)
             if file_path:
-                self.show_sprite_sheet(file_path)
+                # The sheet is only built once its tab is actually shown
+                self.sheet_file = file_path
+                self.update_sprite_sheet()
+    
+    def on_tab_changed(self, event):
+        self.update_sprite_sheet()
+    
+    def update_sprite_sheet(self):
+        """Show the selected file's sprite sheet if the Sprite Sheet tab is visible and it isn't shown yet"""
+        if self.notebook.select() != str(self.sheet_frame):
+            return
+        if self.sheet_file is not None and self.sheet_file != self.sheet_shown_file:
+            self.sheet_shown_file = self.sheet_file
+            self.show_sprite_sheet(self.sheet_file)
+    
+    def compose_sprite_sheet(self, sprites, sprites_per_row=10, padding=5, zoom=4, label_height=16):
+        """
+        Lay out (N, 16, 16, 3) RGB sprites as one composite RGB image, each
+        sprite scaled by zoom with its number written underneath
+        """
+        sprite_size = 16 * zoom
+        cell_width = sprite_size + 2 * padding
+        cell_height = sprite_size + label_height + 2 * padding
+        rows = -(-len(sprites) // sprites_per_row)
+        
+        # Scale every sprite at once, padding the last row with empty cells
+        grid = np.zeros((rows * sprites_per_row, 16, 16, 3), dtype=np.uint8)
+        grid[:len(sprites)] = sprites
+        grid = grid.repeat(zoom, axis=1).repeat(zoom, axis=2)
+        grid = grid.reshape(rows, sprites_per_row, sprite_size, sprite_size, 3).transpose(0, 2, 1, 3, 4)
+        
+        sheet = np.full((rows, cell_height, sprites_per_row, cell_width, 3), 255, dtype=np.uint8)
+        sheet[:, padding:padding + sprite_size, :, padding:padding + sprite_size] = grid
+        sheet = sheet.reshape(rows * cell_height, sprites_per_row * cell_width, 3)
+        for i in range(len(sprites), rows * sprites_per_row):
+            # No sprite here, blank the cell
+            row, col = divmod(i, sprites_per_row)
+            sheet[row * cell_height:(row + 1) * cell_height, col * cell_width:(col + 1) * cell_width] = 255
+        
+        # Draw the sprite numbers into the image
+        img = Image.fromarray(sheet, 'RGB')
+        draw = ImageDraw.Draw(img)
+        for i in range(len(sprites)):
+            row, col = divmod(i, sprites_per_row)
+            x = col * cell_width + cell_width // 2
+            y = row * cell_height + padding + sprite_size + label_height // 2
+            draw.text((x, y), f"#{i}", fill=(0, 0, 0), anchor="mm")
+        return np.asarray(img)
     
     def show_sprite_sheet(self, file_path):
         # Clear previous content
         self.sheet_canvas.delete("all")
+        self.sheet_photo_refs = []
         
         try:
             # Load all sprites from the file
             sprites = self.extract_all_images(file_path)
-            if not sprites:
+            if len(sprites) == 0:
                 self.status_var.set(f"No valid sprites found in {os.path.basename(file_path)}")
                 return
                 
-            # Arrange sprites in a grid (10 per row)
-            sprites_per_row = 10
-            padding = 5
-            sprite_size = 64  # Display size
-            
-            # Create a frame for the sprites
-            sheet_frame = tk.Frame(self.sheet_canvas)
-            self.sheet_canvas.create_window(0, 0, window=sheet_frame, anchor=tk.NW)
-            
-            # Display each sprite
-            self.sheet_photo_refs = []  # Store references to prevent garbage collection
-            for i, sprite in enumerate(sprites):
-                if sprite:
-                    row = i // sprites_per_row
-                    col = i % sprites_per_row
-                    
-                    # Scale up the sprite
-                    sprite_scaled = sprite.resize((sprite_size, sprite_size), Image.NEAREST)
-                    photo = self.pil_to_tkimage(sprite_scaled)
-                    self.sheet_photo_refs.append(photo)
-                    
-                    # Create a frame for each sprite
-                    sprite_frame = tk.Frame(sheet_frame)
-                    sprite_frame.grid(row=row, column=col, padx=padding, pady=padding)
-                    
-                    # Display sprite
-                    sprite_label = tk.Label(sprite_frame, image=photo)
-                    sprite_label.pack()
-                    
-                    # Display sprite number
-                    num_label = tk.Label(sprite_frame, text=f"#{i}")
-                    num_label.pack()
+            # Arrange sprites in a grid (10 per row) as a single image
+            photo = self.rgb_to_photo(self.compose_sprite_sheet(sprites))
+            self.sheet_photo_refs = [photo]  # Store references to prevent garbage collection
+            self.sheet_canvas.create_image(0, 0, image=photo, anchor=tk.NW)
             
             # Update canvas scrolling
-            sheet_frame.update_idletasks()
-            self.sheet_canvas.configure(scrollregion=self.sheet_canvas.bbox("all"))
+            self.sheet_canvas.configure(scrollregion=(0, 0, photo.width(), photo.height()))
             
             self.status_var.set(f"Loaded {len(sprites)} sprites from {os.path.basename(file_path)}")
             
@@ -280,21 +394,18 @@ class STDViewer(tk.Tk):
     
     def extract_first_image(self, std_file):
         """
-        Extract the first 16x16 pixel image from an STD file.
+        Extract the first 16x16 pixel image from an STD file as an RGB array.
         Based on the original C code, we know that:
-        - Each image in the STD file is 256 bytes (16x16 pixels with 1 byte per pixel)
+        - Each image in the STD file is 256 bytes (16*16 pixels with 1 byte per pixel)
         - Each file can contain multiple images (up to 100 - 10 rows of 10 objects)
         """
         try:
-            with open(std_file, 'rb') as f:
-                # From the C code, we can see that each image is 256 bytes (16*16)
-                image_size = 256
-                pixel_data = f.read(image_size)
-                
-                if len(pixel_data) < image_size:
-                    return None  # Not enough data
-                
-                return self.create_image_from_pixel_data(pixel_data)
+            # First sprite comes from the persistent thumbnail cache when the file is unchanged
+            sprite = self.thumbnail_cache.first_sprite(std_file)
+            if sprite is None:
+                return None  # Not enough data
+            
+            return self.create_image_from_pixel_data(sprite)
                 
         except Exception as e:
             print(f"Error reading {std_file}: {e}")
@@ -302,22 +413,12 @@ class STDViewer(tk.Tk):
     
     def extract_all_images(self, std_file):
         """
-        Extract all 16x16 pixel images from an STD file.
+        Extract all 16x16 pixel images from an STD file as an (N, 16, 16, 3) RGB array.
         """
-        sprites = []
         try:
-            with open(std_file, 'rb') as f:
-                file_data = f.read()
-                
-                # Extract sprites (each is 256 bytes)
-                sprite_size = 256
-                for i in range(0, len(file_data), sprite_size):
-                    if i + sprite_size <= len(file_data):
-                        pixel_data = file_data[i:i+sprite_size]
-                        sprite = self.create_image_from_pixel_data(pixel_data)
-                        sprites.append(sprite)
-            
-            return sprites
+            # Decode the whole file and map it through the palette at once
+            # The reader stays open while the sheet is shown, so going back to it is free
+            return self.create_image_from_pixel_data(open_std(std_file).sprites)
                 
         except Exception as e:
             print(f"Error extracting sprites from {std_file}: {e}")
@@ -325,56 +426,16 @@ class STDViewer(tk.Tk):
     
     def create_image_from_pixel_data(self, pixel_data):
         """
-        Create a PIL Image from raw pixel data using the appropriate color palette.
+        Create an RGB array from pixel data using the appropriate color palette.
+        Accepts decoded sprite arrays of any shape or the raw 256 bytes of one sprite.
         """
-        # Create a new RGB image
-        img = Image.new('RGB', (16, 16))
-        pixels = []
-        
-        # Convert each byte to an RGB value using a VGA-style color palette
-        # This palette is based on the standard 16-color VGA palette
-        color_palette = [
-            (0, 0, 0),       # 0: Black
-            (0, 0, 170),     # 1: Blue
-            (0, 170, 0),     # 2: Green
-            (0, 170, 170),   # 3: Cyan
-            (170, 0, 0),     # 4: Red
-            (170, 0, 170),   # 5: Magenta
-            (170, 85, 0),    # 6: Brown
-            (170, 170, 170), # 7: Light Gray
-            (85, 85, 85),    # 8: Dark Gray
-            (85, 85, 255),   # 9: Light Blue
-            (85, 255, 85),   # 10: Light Green
-            (85, 255, 255),  # 11: Light Cyan
-            (255, 85, 85),   # 12: Light Red
-            (255, 85, 255),  # 13: Light Magenta
-            (255, 255, 85),  # 14: Yellow
-            (255, 255, 255)  # 15: White
-        ]
-        
-        # Process each pixel
-        for y in range(16):
-            for x in range(16):
-                index = y * 16 + x
-                if index < len(pixel_data):
-                    # Get color index (limit to 0-15 to avoid index errors)
-                    color_index = pixel_data[index] & 0x0F
-                    if color_index < 0 or color_index >= len(color_palette):
-                        color_index = 0
-                    
-                    # Assign RGB color to pixel
-                    pixels.append(color_palette[color_index])
-                else:
-                    # Default to black if data is missing
-                    pixels.append((0, 0, 0))
-        
-        # Populate the image with pixels
-        img.putdata(pixels)
-        return img
-    
-    def __del__(self):
-        """Destructor to ensure temp files are cleaned up"""
-        self.cleanup_temp_files()
+        if not isinstance(pixel_data, np.ndarray):
+            # Pad short data with black (index 0)
+            pixel_data = bytes(pixel_data[:SPRITE_BYTES]).ljust(SPRITE_BYTES, b'\0')
+            pixel_data = decode_std(pixel_data)[0]
+        
+        # Only the low nibble is used, indexing the standard 16-color VGA palette
+        return to_rgb(pixel_data, VGA16_PALETTE, mask=0x0F)
 
 if __name__ == "__main__":
     app = STDViewer()
@@ -0,0 +1,46 @@
+import hashlib
+
+from std_decoder import STDFile
+
+
+def sprite_digests(std_path):
+    """Content hash of each sprite in a .std file, taken straight from its raw 256-byte records"""
+    with STDFile(std_path) as reader:
+        return [hashlib.blake2b(reader.sprite_bytes(i), digest_size=16).hexdigest() for i in range(len(reader))]
+
+
+class SpriteIndex:
+    """
+    Index of identical sprites across a corpus of .std files. Each sprite is
+    keyed by the hash of its 256 bytes, and each hash maps to the
+    (file, index) pairs where that sprite appears, in the order added.
+    """
+    def __init__(self):
+        self.locations = {}  # Digest -> [(file, index), ...]
+        self.files = {}  # File -> digest of each of its sprites
+
+    def add(self, file, digests):
+        """Add the sprite digests of one file (as returned by sprite_digests)"""
+        self.files[file] = list(digests)
+        for index, digest in enumerate(digests):
+            self.locations.setdefault(digest, []).append((file, index))
+
+    def add_file(self, std_path, file=None):
+        """Hash and add one .std file, under the name `file` (default: its path)"""
+        self.add(std_path if file is None else file, sprite_digests(std_path))
+
+    def first(self, digest):
+        """The (file, index) where a sprite was first seen"""
+        return self.locations[digest][0]
+
+    def sprite_count(self):
+        """Number of sprites added, duplicates included"""
+        return sum(len(digests) for digests in self.files.values())
+
+    def duplicate_count(self):
+        """Number of sprites that repeat one seen earlier"""
+        return self.sprite_count() - len(self.locations)
+
+    def __len__(self):
+        """Number of unique sprites"""
+        return len(self.locations)
@@ -0,0 +1,338 @@
+import os
+import mmap
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Each sprite in an STD file is 16x16 pixels with 1 byte per pixel
+SPRITE_SIZE = 16
+SPRITE_BYTES = SPRITE_SIZE * SPRITE_SIZE
+
+# Layouts in .map files are 100x100 cells
+MAP_SIZE = 100
+
+# Colors of empty cells/transparent pixels and of the cell grid in layout views
+LAYOUT_BACKGROUND = (40, 40, 40)
+LAYOUT_GRID_COLOR = (60, 60, 60)
+
+# Standard 16-color EGA/VGA palette
+VGA16_PALETTE = np.array([
+    (0, 0, 0),         # 0: Black
+    (0, 0, 170),       # 1: Blue
+    (0, 170, 0),       # 2: Green
+    (0, 170, 170),     # 3: Cyan
+    (170, 0, 0),       # 4: Red
+    (170, 0, 170),     # 5: Magenta
+    (170, 85, 0),      # 6: Brown
+    (170, 170, 170),   # 7: Light Gray
+    (85, 85, 85),      # 8: Dark Gray
+    (85, 85, 255),     # 9: Light Blue
+    (85, 255, 85),     # 10: Light Green
+    (85, 255, 255),    # 11: Light Cyan
+    (255, 85, 85),     # 12: Light Red
+    (255, 85, 255),    # 13: Light Magenta
+    (255, 255, 85),    # 14: Yellow
+    (255, 255, 255)    # 15: White
+], dtype=np.uint8)
+
+
+def build_vga256_palette():
+    """Return the 256x3 palette used by the sprite viewer"""
+    # First 16 entries are the EGA/VGA colors, the rest a 6x6x6 color cube
+    i = np.arange(16, 256)
+    cube = np.stack([(i % 6) * 51, ((i // 6) % 6) * 51, ((i // 36) % 6) * 51], axis=1)
+    return np.concatenate([VGA16_PALETTE, cube.astype(np.uint8)])
+
+
+VGA256_PALETTE = build_vga256_palette()
+
+
+def sprite_count(byte_length):
+    """Number of complete sprites held in a buffer of the given length"""
+    return byte_length // SPRITE_BYTES
+
+
+def decode_std(data, count=None):
+    """
+    Decode a whole STD buffer into an (N, 16, 16) uint8 array.
+    Trailing bytes that don't make up a full sprite are ignored. The result
+    is a view on the buffer, so it is read-only when given bytes.
+    """
+    n = sprite_count(len(data))
+    if count is not None:
+        n = min(n, count)
+    return np.frombuffer(data, dtype=np.uint8, count=n * SPRITE_BYTES).reshape(n, SPRITE_SIZE, SPRITE_SIZE)
+
+
+def read_std(file_path, count=None):
+    """Read and decode an STD file from disk"""
+    with open(file_path, 'rb') as f:
+        data = f.read(None if count is None else count * SPRITE_BYTES)
+    return decode_std(data, count)
+
+
+class STDFile:
+    """
+    Memory-mapped, random-access reader for an STD file.
+    Sprites are read on demand as zero-copy views of the mapping, so opening a
+    file costs nothing until its pixels are touched. Arrays handed out keep
+    the mapping alive even after close().
+    """
+    def __init__(self, file_path):
+        self.path = os.fspath(file_path)
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.size = st.st_size
+            self.mtime = st.st_mtime_ns
+            # Empty files can't be mapped
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.count = sprite_count(self.size)
+        self.sprites = decode_std(self.buffer, self.count)
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        """Sprite `index` as a read-only (16, 16) view"""
+        return self.sprites[index]
+    
+    def sprite_bytes(self, index):
+        """Raw 256 bytes of sprite `index` as a memoryview"""
+        if not 0 <= index < self.count:
+            raise IndexError(f"sprite {index} out of range for {self.path} ({self.count} sprites)")
+        return memoryview(self.buffer)[index * SPRITE_BYTES:(index + 1) * SPRITE_BYTES]
+    
+    def is_current(self, st):
+        """True if the file still has the size and mtime it had when it was opened"""
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime
+    
+    def close(self):
+        self.sprites = None
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass  # Views of it are still in use, it is unmapped once they're gone
+        self.buffer = b''
+        self.count = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Readers of the sheets being displayed, shared through open_std. Files that are
+# read once (thumbnails, conversion) use STDFile directly and close it, since an
+# open mapping stops the file being replaced on Windows and turns truncating it
+# into SIGBUS on POSIX.
+_open_files = OrderedDict()
+_open_files_lock = threading.Lock()
+MAX_OPEN_FILES = 4
+
+
+def open_std(file_path):
+    """
+    Return a shared STDFile for file_path, reusing an open one if the file is
+    unchanged. The least recently used readers are closed past MAX_OPEN_FILES.
+    """
+    path = os.path.abspath(file_path)
+    st = os.stat(path)
+    with _open_files_lock:
+        std_file = _open_files.get(path)
+        if std_file is not None and std_file.is_current(st):
+            _open_files.move_to_end(path)
+            return std_file
+    
+    std_file = STDFile(path)
+    with _open_files_lock:
+        stale = _open_files.pop(path, None)
+        _open_files[path] = std_file
+        while len(_open_files) > MAX_OPEN_FILES:
+            _open_files.popitem(last=False)[1].close()
+    if stale is not None:
+        stale.close()
+    return std_file
+
+
+def to_rgb(sprites, palette=VGA256_PALETTE, mask=None):
+    """
+    Map palette indices to RGB through a lookup table.
+    Works on any shape of index array and returns the same shape plus a
+    trailing RGB axis. `mask` is ANDed onto the indices first, e.g. 0x0F
+    to restrict them to the 16-color palette.
+    """
+    if mask is not None:
+        sprites = sprites & mask
+    return palette[sprites]
+
+
+def empty_map():
+    """A layout with every cell empty (-1), indexed [x, y]"""
+    return np.full((MAP_SIZE, MAP_SIZE), -1, dtype=np.int16)
+
+
+def read_map(file_path):
+    """
+    Read a .map file into an int16 (100, 100) layout array indexed [x, y].
+    The file holds one value per line, row by row. Cells missing from a
+    truncated file stay empty (-1); values past the 10000th are ignored.
+    Values that don't fit in an int16 are warned about and left empty.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    # Only the first 10000 values count, so trailing junk (e.g. a DOS ^Z EOF
+    # byte) is split off before parsing; any run of whitespace separates values
+    tokens = data.split(None, MAP_SIZE * MAP_SIZE)[:MAP_SIZE * MAP_SIZE]
+    try:
+        # Parsed in C
+        values = np.fromstring(b" ".join(tokens), dtype=np.int64, sep=" ")
+    except ValueError:
+        raise ValueError(f"{file_path}: not a list of integers")
+    
+    bad = np.flatnonzero((values < -32768) | (values > 32767))
+    if len(bad):
+        y, x = divmod(int(bad[0]), MAP_SIZE)
+        print(f"Warning: {file_path}: {len(bad)} values out of range, the first is {values[bad[0]]} "
+              f"at cell ({x}, {y}); treating them as empty")
+        values[bad] = -1
+    
+    # Values are stored row by row, i.e. [y, x]
+    layout = np.full(MAP_SIZE * MAP_SIZE, -1, dtype=np.int16)
+    layout[:len(values)] = values
+    return np.ascontiguousarray(layout.reshape(MAP_SIZE, MAP_SIZE).T)
+
+
+def layout_pixels(layout, sprites):
+    """
+    Gather the tiles of a layout into one image of palette indices. layout is
+    indexed [x, y] with values indexing sprites (row*10+index for a shape
+    sheet); cells with any other value are empty and come out as index 0.
+    Returns a (height*16, width*16) array indexed [y, x].
+    """
+    # Empty cells point at an extra blank tile appended after the sprites
+    tiles = np.concatenate([sprites, np.zeros((1, SPRITE_SIZE, SPRITE_SIZE), dtype=np.uint8)])
+    cells = layout.T
+    cells = np.where((cells >= 0) & (cells < len(sprites)), cells, len(sprites))
+    height, width = cells.shape
+    return tiles[cells].transpose(0, 2, 1, 3).reshape(height * SPRITE_SIZE, width * SPRITE_SIZE)
+
+
+# Shape metadata fields from the original code, 4-byte little-endian ints
+INF_FIELDS = ("w", "h", "n", "c", "flag", "rowflag")
+INF_SHAPE = np.dtype([(name, "<i4") for name in INF_FIELDS])
+
+# A shape record in a .inf file: the fields followed by the 256 shape bytes
+INF_RECORD = np.dtype(INF_SHAPE.descr + [("shp", "V256")])
+
+
+def read_inf(file_path, strict=False):
+    """
+    Read a .inf file containing sprite metadata.
+    Each row starts with a text line holding its max shape index, followed by
+    max+1 shape records. Returns (row_max, shapes): the max for each row
+    found, and a (10, 10) INF_SHAPE structured array of shape metadata
+    (zero where a shape is absent). Problems raise ValueError naming the byte
+    offset; a truncated last record is only warned about unless strict.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    
+    shapes = np.zeros((10, 10), dtype=INF_SHAPE)
+    row_max = []
+    pos = 0
+    for row in range(10):
+        # Read the max count for this row
+        end = data.find(b"\n", pos)
+        end = len(data) if end < 0 else end + 1
+        max_count_str = data[pos:end].strip()
+        if not max_count_str:
+            break
+        try:
+            max_count = int(max_count_str)
+        except ValueError:
+            raise ValueError(f"{file_path}: bad max count {max_count_str[:20]!r} for row {row} at byte offset {pos}")
+        if max_count < 0:
+            raise ValueError(f"{file_path}: negative max count {max_count} for row {row} at byte offset {pos}")
+        pos = end
+        
+        # Decode the row's records (including the last one) in one go
+        wanted = max_count + 1
+        available = (len(data) - pos) // INF_RECORD.itemsize
+        if available < wanted:
+            message = (f"{file_path}: row {row} needs {wanted} shape records but the data ends "
+                       f"after {available}, at byte offset {pos + available * INF_RECORD.itemsize}")
+            if strict:
+                raise ValueError(message)
+            print(f"Warning: {message}")
+        count = min(wanted, available)
+        records = np.frombuffer(data, dtype=INF_RECORD, count=count, offset=pos)
+        
+        # Only 10 shapes per row are kept (TOTALSHAPE); shape data is already loaded from .std
+        for name in INF_FIELDS:
+            shapes[name][row, :min(count, 10)] = records[name][:10]
+        row_max.append(max_count)
+        pos += count * INF_RECORD.itemsize
+        if count < wanted:
+            break
+    
+    return np.array(row_max, dtype=np.int32), shapes
+
+
+# Animation objects saved in .dat files (TOTALANIMS records of animobjects)
+TOTALANIMS = 10
+ANIM_FIELDS = ("active", "animwidth", "animheight", "animox", "animoy", "animx", "animy",
+               "prox", "animspeed", "currentshape", "oldshape", "max", "row")
+
+
+def anim_record_dtype(int_size=4, align=None):
+    """
+    Struct layout of one animobjects record: all fields are ints of int_size
+    bytes (2 for 16-bit DOS compilers, 4 for 32-bit ones), little-endian. If
+    align is given the record size is padded to a multiple of it, as some
+    compilers do for arrays of structs.
+    """
+    if int_size not in (2, 4):
+        raise ValueError(f"unsupported int size {int_size}, expected 2 or 4")
+    itemsize = len(ANIM_FIELDS) * int_size
+    if align:
+        itemsize = -(-itemsize // align) * align
+    return np.dtype({
+        "names": list(ANIM_FIELDS),
+        "formats": [f"<i{int_size}"] * len(ANIM_FIELDS),
+        "offsets": [i * int_size for i in range(len(ANIM_FIELDS))],
+        "itemsize": itemsize,
+    })
+
+
+def empty_anims(count=TOTALANIMS):
+    """Animation object columns, all zero"""
+    return {name: np.zeros(count, dtype=np.int32) for name in ANIM_FIELDS}
+
+
+def read_dat(file_path, int_size=None, align=None, count=TOTALANIMS):
+    """
+    Read a .dat file of animation objects into a struct of arrays: a dict
+    mapping each ANIM_FIELDS name to an int32 column of `count` values.
+    With int_size=None the int size is guessed from the file size (2 if the
+    file holds exactly `count` 2-byte-int records, else 4). Records missing
+    from a short file stay zero.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    
+    if int_size is None:
+        int_size = 2 if len(data) == count * anim_record_dtype(2, align).itemsize else 4
+    record = anim_record_dtype(int_size, align)
+    available = min(count, len(data) // record.itemsize)
+    if available < count:
+        print(f"Warning: {file_path} holds {available} of {count} animation objects "
+              f"({len(data)} bytes, {record.itemsize} per record)")
+    
+    records = np.frombuffer(data, dtype=record, count=available)
+    anims = empty_anims(count)
+    for name in ANIM_FIELDS:
+        anims[name][:available] = records[name]
+    return anims
@@ -0,0 +1,242 @@
+"""
+Headless STD to BMP/PNG converter.
+
+Converts every .std file found under the given files or directories. Like
+the original STDCNV.EXE, the sprites of <name>.std are saved as
+<name>/<name>_N.bmp, with the directory layout of the sources mirrored
+under the output directory. Files are converted in parallel on a process pool.
+
+With --atlas each .std is instead saved as a single <name>.<ext> atlas image,
+10 sprites per row like the STDCNV.EXE preview, plus a <name>.json index of
+the sprite rectangles and the flags from the matching .inf file.
+
+With --dedup sprites that appear more than once in the corpus are written
+only once, as sprites/<hash>.<ext>, and index.json records for every .std
+file which sprite image each of its sprites uses.
+
+use: python stdconv.py [-o OUTDIR] [--format bmp|png] [--atlas | --dedup] [--jobs N] SOURCE [SOURCE ...]
+"""
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from batch import run_jobs, unique_outputs
+from file_index import directory_index
+from sprite_index import SpriteIndex, sprite_digests
+from std_decoder import SPRITE_SIZE, VGA256_PALETTE, STDFile, read_inf, read_std
+
+FORMATS = ("bmp", "png")
+ATLAS_COLUMNS = 10
+DEDUP_SPRITE_DIR = "sprites"
+
+
+def find_std_files(sources):
+    """Yield (std_path, relative_dir) for each .std file in the given files/directories"""
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".std"):
+                        yield Path(root) / name, Path(root).relative_to(source)
+        else:
+            yield source, Path()
+
+
+def sprite_image(pixels):
+    """Make an 8-bit paletted image from an array of palette indices"""
+    img = Image.fromarray(pixels, "P")
+    img.putpalette(VGA256_PALETTE.tobytes())
+    return img
+
+
+def convert_file(std_path, out_dir, fmt="bmp"):
+    """Save every sprite of one .std file as out_dir/<name>/<name>_N.<fmt>, returning the count"""
+    name = Path(std_path).stem
+    target = Path(out_dir) / name
+    target.mkdir(parents=True, exist_ok=True)
+
+    sprites = read_std(std_path)
+    for i, sprite in enumerate(sprites):
+        sprite_image(sprite).save(target / f"{name}_{i}.{fmt}")
+    return len(sprites)
+
+
+def find_inf_file(std_path):
+    """Return the .inf file belonging to a .std file (matched in any case), or None"""
+    std_path = Path(std_path)
+    inf = directory_index(std_path.parent).find(std_path.stem).get("inf")
+    return Path(inf.path) if inf is not None else None
+
+
+def atlas_index(sprite_count, image_name, inf=None):
+    """Build the JSON index of sprite rectangles (and .inf flags, given read_inf's result) for an atlas"""
+    row_max, shapes = inf if inf is not None else ([], None)
+    sprites = []
+    for i in range(sprite_count):
+        row, col = divmod(i, ATLAS_COLUMNS)
+        entry = {"index": i, "x": col * SPRITE_SIZE, "y": row * SPRITE_SIZE,
+                 "width": SPRITE_SIZE, "height": SPRITE_SIZE}
+        # Shape s of row r in the .inf file describes sprite r*10+s
+        if row < len(row_max) and col <= min(row_max[row], 9):
+            entry["flag"] = int(shapes["flag"][row, col])
+            entry["rowflag"] = int(shapes["rowflag"][row, col])
+        sprites.append(entry)
+    return {
+        "image": image_name,
+        "sprite_size": SPRITE_SIZE,
+        "columns": ATLAS_COLUMNS,
+        "row_max": [int(max_count) for max_count in row_max],
+        "sprites": sprites,
+    }
+
+
+def export_atlas(std_path, out_dir, fmt="bmp"):
+    """Save one .std file as out_dir/<name>.<fmt> plus out_dir/<name>.json, returning the sprite count"""
+    name = Path(std_path).stem
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Lay the sprites out 10 per row, padding the last row with index 0
+    sprites = read_std(std_path)
+    rows = max(1, -(-len(sprites) // ATLAS_COLUMNS))
+    grid = np.zeros((rows * ATLAS_COLUMNS, SPRITE_SIZE, SPRITE_SIZE), dtype=np.uint8)
+    grid[:len(sprites)] = sprites
+    pixels = grid.reshape(rows, ATLAS_COLUMNS, SPRITE_SIZE, SPRITE_SIZE).transpose(0, 2, 1, 3)
+    image_name = f"{name}.{fmt}"
+    sprite_image(pixels.reshape(rows * SPRITE_SIZE, ATLAS_COLUMNS * SPRITE_SIZE)).save(out_dir / image_name)
+
+    inf_path = find_inf_file(std_path)
+    inf = read_inf(inf_path) if inf_path else None
+    with open(out_dir / f"{name}.json", "w") as f:
+        json.dump(atlas_index(len(sprites), image_name, inf), f, indent=1)
+    return len(sprites)
+
+
+def _convert_job(job):
+    std_path, out_dir, fmt, atlas = job
+    try:
+        export = export_atlas if atlas else convert_file
+        return std_path, export(std_path, out_dir, fmt), None
+    except Exception as e:
+        return std_path, 0, e
+
+
+def _digest_job(std_path):
+    try:
+        return sprite_digests(std_path), None
+    except Exception as e:
+        return None, e
+
+
+def _write_sprites_job(job):
+    std_path, sprites, sprite_dir, fmt = job
+    try:
+        with STDFile(std_path) as reader:
+            for index, digest in sprites:
+                sprite_image(reader[index]).save(Path(sprite_dir) / f"{digest}.{fmt}")
+        return std_path, len(sprites), None
+    except Exception as e:
+        return std_path, 0, e
+
+
+def export_deduplicated(sources, out_dir, fmt="bmp", jobs=None):
+    """
+    Save each distinct sprite under sources once, as out_dir/sprites/<hash>.<fmt>,
+    plus an out_dir/index.json mapping every .std file to the hashes of its
+    sprites. Files are named by their path relative to their source, prefixed
+    as described in batch.unique_outputs when there are several sources.
+    Returns (files, unique sprites, duplicates, errors).
+    """
+    outputs, errors = unique_outputs(sources, lambda source: (
+        (std_path, rel_dir / std_path.name) for std_path, rel_dir in find_std_files([source])))
+    found = {out_path.as_posix(): std_path for std_path, out_path in outputs}
+    sprite_dir = Path(out_dir) / DEDUP_SPRITE_DIR
+    sprite_dir.mkdir(parents=True, exist_ok=True)
+    index = SpriteIndex()
+
+    # Hash every sprite, then build the index in file order
+    for (name, std_path), (digests, error) in zip(found.items(), run_jobs(_digest_job, list(found.values()), jobs)):
+        if error is not None:
+            print(f"Error reading {std_path}: {error}", file=sys.stderr)
+            errors += 1
+        else:
+            index.add(name, digests)
+
+    # Write each unique sprite from the file it was first seen in
+    first_seen = {}
+    for digest in index.locations:
+        name, sprite = index.first(digest)
+        first_seen.setdefault(name, []).append((sprite, digest))
+    work = [(found[name], sprites, sprite_dir, fmt) for name, sprites in first_seen.items()]
+    for std_path, count, error in run_jobs(_write_sprites_job, work, jobs):
+        if error is not None:
+            print(f"Error converting {std_path}: {error}", file=sys.stderr)
+            errors += 1
+
+    with open(Path(out_dir) / "index.json", "w") as f:
+        json.dump({
+            "sprite_dir": DEDUP_SPRITE_DIR,
+            "format": fmt,
+            "sprites": {digest: {"file": locations[0][0], "index": locations[0][1], "count": len(locations)}
+                        for digest, locations in index.locations.items()},
+            "files": index.files,
+        }, f, indent=1)
+    return len(index.files), len(index), index.duplicate_count(), errors
+
+
+def convert_all(sources, out_dir, fmt="bmp", jobs=None, atlas=False):
+    """
+    Convert all .std files under sources on a process pool. With several sources
+    the output paths are prefixed as described in batch.unique_outputs, and files
+    that would overwrite another one's output are skipped as errors.
+    Returns (files, sprites, errors).
+    """
+    # Output is <name>.<fmt>/.json (atlas) or <name>/<name>_N.<fmt>, so the stem must be unique
+    outputs, errors = unique_outputs(sources, lambda source: (
+        (std_path, rel_dir / std_path.stem) for std_path, rel_dir in find_std_files([source])))
+    work = [(std_path, Path(out_dir) / out_path.parent, fmt, atlas) for std_path, out_path in outputs]
+    converted = sprites = 0
+
+    for std_path, count, error in run_jobs(_convert_job, work, jobs):
+        if error is not None:
+            print(f"Error converting {std_path}: {error}", file=sys.stderr)
+            errors += 1
+        else:
+            converted += 1
+            sprites += count
+    return converted, sprites, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert .std sprite sets to BMP or PNG files")
+    parser.add_argument("sources", nargs="+", help=".std files or directories to search recursively")
+    parser.add_argument("-o", "--output", default=".", help="output directory (default: current directory)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="bmp", help="image format (default: bmp)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("-a", "--atlas", action="store_true",
+                      help="write one atlas image and JSON index per .std instead of one file per sprite")
+    mode.add_argument("-d", "--dedup", action="store_true",
+                      help="write each distinct sprite once, plus an index.json of which sprites each .std uses")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.dedup:
+        converted, unique, duplicates, errors = export_deduplicated(args.sources, args.output, args.format, args.jobs)
+        print(f"saved {unique} unique sprites from {converted} .std files in {args.output} "
+              f"({duplicates} duplicates referenced in index.json)")
+        return 1 if errors else 0
+
+    converted, sprites, errors = convert_all(args.sources, args.output, args.format, args.jobs, args.atlas)
+    print(f"saved {sprites} sprites from {converted} .std files in {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
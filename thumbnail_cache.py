@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from std_decoder import SPRITE_BYTES, SPRITE_SIZE, STDFile
+
+# Hits only refresh an entry's last-used time when it is older than this (seconds)
+USED_RESOLUTION = 24 * 60 * 60
+
+
+def default_cache_path():
+    """Location of the shared thumbnail store (under $XDG_CACHE_HOME or ~/.cache)"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "draw71", "thumbnails.sqlite")
+
+
+class ThumbnailCache:
+    """
+    Persistent cache of the first sprite of each .std file, kept in sqlite.
+    Entries are keyed by (path, size, mtime), so a changed file is simply
+    re-read. Only the raw 16x16 palette indices are stored; each viewer maps
+    them through its own palette and scales them itself. Safe to share
+    between threads, and between viewers using the same file: the database
+    is in WAL mode, so readers never wait for a writer, and each write is
+    committed on its own, so the write lock is only held for a moment. If
+    the database can't be used the file is simply read directly.
+    """
+    def __init__(self, path=None, max_bytes=32 * 1024 * 1024):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit: no transaction is left open between writes
+            self.db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few entries on a power cut is fine for a cache; skip the fsyncs
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.create_tables()
+        except (OSError, sqlite3.Error) as e:
+            # Still work (without persistence) if the cache location isn't writable
+            print(f"Error opening thumbnail cache {self.path}: {e}")
+            self.db = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            self.create_tables()
+
+    def create_tables(self):
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS thumbs ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, used REAL, data BLOB)"
+        )
+
+    def first_sprite(self, std_file):
+        """Return the first sprite of std_file as a (16, 16) array, or None if it has none"""
+        std_file = os.path.abspath(std_file)
+        st = os.stat(std_file)
+        key = (std_file, st.st_size, st.st_mtime_ns)
+        try:
+            data = self.lookup(key)
+        except sqlite3.Error:
+            data = None  # E.g. locked by another viewer for too long; read the file instead
+
+        if data is None:
+            data = self.read_first_sprite(std_file)
+            try:
+                self.store(key, data)
+            except sqlite3.Error:
+                pass  # Cached next time
+
+        if len(data) < SPRITE_BYTES:
+            return None
+        return np.frombuffer(data, dtype=np.uint8).reshape(SPRITE_SIZE, SPRITE_SIZE)
+
+    def read_first_sprite(self, std_file):
+        """Raw bytes of the first sprite of std_file, empty if it has none"""
+        # Only the first sprite's page of the mapping gets read, and the file
+        # isn't kept open (or mapped) once its 256 bytes are copied out
+        with STDFile(std_file) as reader:
+            # Files too short for a sprite are cached as empty, so they aren't re-read either
+            return bytes(reader.sprite_bytes(0)) if len(reader) else b""
+
+    def lookup(self, key):
+        """Stored data for key as (path, size, mtime), or None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT data, used FROM thumbs WHERE path = ? AND size = ? AND mtime = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            data, used = row
+            now = time.time()
+            # Pruning only needs a rough age, so don't turn every read into a write
+            if now - used > USED_RESOLUTION:
+                try:
+                    self.db.execute("UPDATE thumbs SET used = ? WHERE path = ?", (now, key[0]))
+                except sqlite3.Error:
+                    pass  # Only affects which entries get pruned first
+        return data
+
+    def store(self, key, data):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO thumbs (path, size, mtime, used, data) VALUES (?, ?, ?, ?, ?)",
+                (*key, time.time(), data)
+            )
+
+    def size_bytes(self):
+        """Approximate size of the stored entries"""
+        return self.db.execute("SELECT COALESCE(SUM(LENGTH(path) + LENGTH(data) + 24), 0) FROM thumbs").fetchone()[0]
+
+    def prune(self):
+        """Drop least recently used entries until the cache is back under max_bytes"""
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        # Free a little extra so we don't prune again on every scan
+        excess += self.max_bytes // 10
+        freed = 0
+        stale = []
+        for path, entry_bytes in self.db.execute(
+                "SELECT path, LENGTH(path) + LENGTH(data) + 24 FROM thumbs ORDER BY used"):
+            if freed >= excess:
+                break
+            stale.append((path,))
+            freed += entry_bytes
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany("DELETE FROM thumbs WHERE path = ?", stale)
+            self.db.execute("COMMIT")
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def commit(self):
+        """Finish a scan: entries are saved as they are added, so this just prunes the cache if it grew too large"""
+        with self.lock:
+            try:
+                self.prune()
+            except sqlite3.Error as e:
+                print(f"Error saving thumbnail cache {self.path}: {e}")
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.db.close()